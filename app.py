@@ -2,8 +2,9 @@
 Flask app: Eugene the AI Sea Cow chat interface.
 
 This is the main Python file that runs the web server. It provides two endpoints:
-1. GET  /           → Serves the chat UI (HTML page)
-2. POST /api/chat   → Handles chat messages and returns AI responses
+1. GET  /                 → Serves the chat UI (HTML page)
+2. POST /api/chat         → Handles chat messages and returns AI responses
+3. POST /api/chat/stream  → Same, but streams the response as it's generated
 
 The app uses OpenAI and Anthropic APIs to generate responses and can perform
 live web searches using Brave Search API with optional source filtering.
@@ -18,11 +19,12 @@ Environment variables (set in .env file):
 # IMPORTS
 # ============================================================================
 
-# Load environment variables from .env file
-from dotenv import load_dotenv
+# Read environment variables from .env file
+from dotenv import dotenv_values
 
 # Flask web framework components
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request
+from flask.json.provider import DefaultJSONProvider  # Base class for Flask's JSON handling
 from flask_cors import CORS  # Allows cross-origin requests
 
 # Standard Python libraries - import these FIRST
@@ -30,150 +32,1664 @@ import logging  # For logging messages to console
 import os       # For reading environment variables
 from pathlib import Path  # For working with file paths
 import re       # For regular expression pattern matching
-import requests  # For making HTTP requests to Brave Search API
+import sqlite3  # For the on-disk response cache
+import asyncio   # For running upstream API calls concurrently
+import functools # For wrapping functions in caching decorators
+import gzip      # For compressing the chat page once, ahead of time
+from concurrent.futures import Future  # For sharing one AI call between identical requests
+import atexit    # For closing shared connections when the process exits
+import hashlib   # For hashing prompts into cache keys
+import threading # For the background thread that runs the asyncio event loop
+import time      # For cache expiry timestamps
+from collections import ChainMap, OrderedDict, namedtuple  # Config lookups / LRU ordering / records
 import json      # For parsing JSON responses
 from datetime import datetime  # For working with dates and times
 
+# HTTP client for Brave Search and the economic data APIs
+import httpx
+
+# Fast JSON parsing (optional) - falls back to the standard json module
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Brotli decompression in httpx needs the optional "brotli" package
+try:
+    import brotli  # noqa: F401
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# HTTP/2 support in httpx needs the optional "h2" package
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Response compression (optional) - gzip/brotli for the page, CSS/JS and JSON
+try:
+    from flask_compress import Compress
+    COMPRESS_AVAILABLE = True
+except ImportError:
+    COMPRESS_AVAILABLE = False
+
+# Exact token counts for trimming long conversations (optional) - without
+# it, tokens are estimated from the text length
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Error reporting (optional) - only used when SENTRY_DSN is set
+try:
+    import sentry_sdk
+    SENTRY_AVAILABLE = True
+except ImportError:
+    SENTRY_AVAILABLE = False
+
 # OpenAI API client
-from openai import OpenAI
+from openai import APITimeoutError, NotFoundError, OpenAI
+
+# The Anthropic API client for Claude models is imported lazily, the first
+# time a Claude model is requested (see get_anthropic_client below), so
+# workers that only serve GPT models never pay for importing it
+
+
+# ============================================================================
+# CONFIGURATION & SETUP
+# ============================================================================
+
+# Read environment variables from the .env file in the same directory as this file
+# This lets us keep secrets (like API keys) out of the code
+# Values in .env take priority over the process environment. The ChainMap
+# looks keys up in each layer in turn, so nothing is copied into os.environ.
+dotenv_path = Path(__file__).resolve().parent / ".env"
+_env = ChainMap(
+    {key: value for key, value in dotenv_values(dotenv_path).items() if value is not None},
+    os.environ
+)
+
+# Set up logging so we can see what's happening
+# INFO level means we'll see informational messages and errors
+logging.basicConfig(level=logging.INFO)
+
+# Read the API keys once at startup instead of on every request
+OPENAI_API_KEY = _env.get("OPENAI_API_KEY")        # Required for GPT models
+ANTHROPIC_API_KEY = _env.get("ANTHROPIC_API_KEY")  # Required for Claude models
+BRAVE_API_KEY = _env.get("BRAVE_API_KEY")          # Required for web search
+BEA_API_KEY = _env.get("BEA_API_KEY")              # Required for BEA GDP data
+BLS_API_KEY = _env.get("BLS_API_KEY")              # Optional (BLS works without it, with lower rate limits)
+CENSUS_API_KEY = _env.get("CENSUS_API_KEY")        # Required for Census ACS data
+
+# How many Brave Search results to request for a general web search
+# (DataUSA/FRED economic searches always ask for 5)
+BRAVE_RESULT_COUNT = int(_env.get("BRAVE_RESULT_COUNT", "5"))
+
+# Brave's free plan allows 1 request per second (faster requests get 429
+# errors), so Brave requests are sent one at a time, spaced this far apart.
+# Raise these on a paid plan.
+BRAVE_CONCURRENCY = int(_env.get("BRAVE_CONCURRENCY", "1"))       # Requests in flight at once
+BRAVE_MIN_INTERVAL = float(_env.get("BRAVE_MIN_INTERVAL", "1.0"))  # Seconds between request starts
+
+# Largest chat request body we accept (the whole conversation is sent every
+# turn, but even long chats are far below this)
+MAX_REQUEST_BYTES = int(_env.get("MAX_REQUEST_BYTES", str(1024 * 1024)))  # Default 1 MB
+
+# Longest answer the AI model may write, in tokens. A lower limit makes
+# answers come back faster, but charts (chartjson) need room, so the
+# default is well above a typical reply. Requests can ask for less (or up
+# to MAX_OUTPUT_TOKENS_LIMIT) with "max_tokens".
+MAX_OUTPUT_TOKENS = int(_env.get("MAX_OUTPUT_TOKENS", "1024"))
+MAX_OUTPUT_TOKENS_LIMIT = 4096
+
+# Conversation history sent to the AI model, in tokens. Older turns beyond
+# this are dropped (system messages and the latest question are always kept).
+HISTORY_TOKEN_BUDGET = int(_env.get("HISTORY_TOKEN_BUDGET", "6000"))
+
+# Small model that summarizes the trimmed turns (empty = just drop them).
+# Turns are trimmed in blocks of HISTORY_SUMMARY_BLOCK, so one cached
+# summary is reused for several turns in a row.
+HISTORY_SUMMARY_MODEL = _env.get("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+HISTORY_SUMMARY_BLOCK = 6
+
+# Longest single question we send to the AI model, in characters (longer
+# ones get a 413 error instead of an expensive, slow call)
+MAX_QUESTION_CHARS = int(_env.get("MAX_QUESTION_CHARS", "4000"))
+
+# Most messages one /api/chat request can send (a real chat is far shorter;
+# checked before looking at each message)
+MAX_MESSAGES = int(_env.get("MAX_MESSAGES", "200"))
+
+# Most questions one /api/chat request can send in its "prompts" list
+# (they're answered together in a single GPT call, see answer_prompt_batch)
+MAX_BATCH_PROMPTS = int(_env.get("MAX_BATCH_PROMPTS", "20"))
+
+# Client-side deadlines (in seconds) for upstream calls, so one slow
+# request can't tie up a worker for minutes. A call that times out is
+# retried once; if it times out again the user gets a 504 error.
+LLM_TIMEOUT = float(_env.get("LLM_TIMEOUT", "60"))        # Each Claude/GPT completion
+SEARCH_TIMEOUT = float(_env.get("SEARCH_TIMEOUT", "8"))   # Each web search / economic data lookup
+
+# Check if the OpenAI API key is set and log a message
+if OPENAI_API_KEY:
+    # Show first 7 characters of the key (for debugging) but hide the rest for security
+    logging.info("OPENAI_API_KEY detected: %s***", OPENAI_API_KEY[:7])
+else:
+    # Warn if the API key is missing (the app won't work without it)
+    logging.warning("OPENAI_API_KEY not set")
+
+# Check if the Anthropic API key is set (for Claude models)
+if ANTHROPIC_API_KEY:
+    logging.info("ANTHROPIC_API_KEY detected: %s***", ANTHROPIC_API_KEY[:7])
+else:
+    logging.warning("ANTHROPIC_API_KEY not set (Claude models will not work)")
+
+# Check if Brave Search API key is set (for web search with any model)
+if BRAVE_API_KEY:
+    logging.info("BRAVE_API_KEY detected: %s***", BRAVE_API_KEY[:7])
+else:
+    logging.warning("BRAVE_API_KEY not set (web search will not work)")
+
+# Check the keys for the economic data APIs (warn once here, not on every call)
+if not BEA_API_KEY:
+    logging.warning("BEA_API_KEY not set (BEA GDP data will not be fetched)")
+if not CENSUS_API_KEY:
+    logging.warning("CENSUS_API_KEY not set (Census ACS data will not be fetched)")
+
+# Report unhandled errors to Sentry if it's configured
+# (the Flask integration is switched on automatically once Flask is installed)
+SENTRY_DSN = _env.get("SENTRY_DSN")
+if SENTRY_DSN:
+    if SENTRY_AVAILABLE:
+        sentry_sdk.init(dsn=SENTRY_DSN)
+        logging.info("Sentry error reporting enabled")
+    else:
+        logging.warning("SENTRY_DSN is set but sentry-sdk is not installed. Install with: pip install sentry-sdk")
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that uses orjson (much faster than the standard json
+    module) for jsonify() responses and request.get_json().
+    
+    Keys are kept in the order they were added instead of being sorted.
+    """
+    sort_keys = False
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SORT_KEYS if kwargs.pop("sort_keys", self.sort_keys) else 0
+        if kwargs.pop("indent", None):
+            option |= orjson.OPT_INDENT_2
+        kwargs.pop("separators", None)  # orjson output is always compact
+        if kwargs:
+            # Options orjson doesn't have - let the standard json module handle them
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+    
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Same as Flask's version, but hands orjson's bytes straight to the
+        # response instead of decoding them to a string and encoding it back
+        obj = self._prepare_response_obj(args, kwargs)
+        option = orjson.OPT_APPEND_NEWLINE
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option), mimetype=self.mimetype
+        )
+
+
+# Initialize the Flask web application
+app = Flask(__name__)
+
+# Use orjson for JSON requests and responses when it's installed
+if ORJSON_AVAILABLE:
+    app.json = OrjsonProvider(app)
+
+# Refuse oversized request bodies before reading them
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+
+# Enable CORS (Cross-Origin Resource Sharing) for the API only
+# The chat page calls the API from the same site, which doesn't need CORS;
+# this lets pages on other sites call /api/* too. CORS_ORIGINS is a
+# comma-separated list of allowed sites ("*" = any); set it to an empty
+# value to turn CORS off and skip its per-request work entirely.
+CORS_ORIGINS = [origin.strip() for origin in _env.get("CORS_ORIGINS", "*").split(",") if origin.strip()]
+if CORS_ORIGINS:
+    CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}})
+
+# Compress responses (brotli, else gzip) for browsers that accept it
+# Server-Sent Events (text/event-stream) aren't in Flask-Compress's list of
+# mimetypes, so streamed answers still go out uncompressed, piece by piece
+if COMPRESS_AVAILABLE:
+    app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+    app.config["COMPRESS_MIN_SIZE"] = 512  # Smaller responses aren't worth it
+    Compress(app)
+
+# Flask-Compress marks the ETag of a compressed response, e.g. "abc" becomes
+# "abc:br", and browsers send that marked tag back in If-None-Match
+_COMPRESSED_ETAG_RE = re.compile(r':(?:br|gzip)"')
+
+
+@app.before_request
+def strip_compressed_etag():
+    """
+    Remove Flask-Compress's ":br"/":gzip" ETag marks from If-None-Match.
+    
+    Without this, the tags browsers send back would never match the ETags
+    of the chat page or static files, and they'd never get a 304 response.
+    """
+    tags = request.environ.get("HTTP_IF_NONE_MATCH")
+    if tags and ":" in tags:
+        request.environ["HTTP_IF_NONE_MATCH"] = _COMPRESSED_ETAG_RE.sub('"', tags)
+
+# Control browser caching
+@app.after_request
+def add_header(response):
+    """
+    Add cache control headers.
+    
+    - API responses are never cached.
+    - Static files requested with a ?v= version (as the chat page links them)
+      are cached for a year: the version changes whenever the files do,
+      so a changed file always gets a new URL.
+    - The chat page and other static files may be kept by the browser, but it
+      must check their ETag with the server before reusing them ("no-cache").
+      When nothing changed the server answers with an empty 304 response,
+      so edits still show up on the next page load.
+    """
+    if request.path.startswith("/api/"):
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '-1'
+    elif request.path.startswith("/static/") and "v" in request.args:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.after_request
+def log_chat_request(response):
+    """
+    Write one JSON log line per chat request, for dashboards and alerts.
+    
+    api_chat() fills in g.chat as it goes (which provider answered, whether
+    the APIs or web search were used, cache hits...). For streamed responses
+    "ms" is the time until the stream started, not until it finished.
+    
+    Requests that got as far as the response cache also get an
+    X-Cache: HIT or MISS header, to make cache behavior easy to check.
+    """
+    chat = g.pop("chat", None)
+    if chat is not None:
+        if "response_cache_hit" in chat:
+            response.headers["X-Cache"] = "HIT" if chat["response_cache_hit"] else "MISS"
+        chat["status"] = response.status_code
+        chat["ms"] = round((time.perf_counter() - g.pop("chat_start")) * 1000, 1)
+        # Only build the JSON when INFO logs are actually being written
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(json_dumps({"event": "chat_done", **chat}))
+    return response
+
+# Create one shared HTTP client for the OpenAI and Anthropic SDKs, so both
+# draw from a single connection pool. Reusing the client keeps
+# TCP/TLS connections open between requests instead of doing a fresh
+# handshake on every call, and HTTP/2 lets bursts of requests to the same
+# host share one connection.
+http_client = httpx.Client(
+    timeout=600.0,  # Upper bound; the SDK clients pass LLM_TIMEOUT on every request
+    transport=httpx.HTTPTransport(
+        http2=HTTP2_AVAILABLE,
+        # Keep idle connections for a minute (httpx's default is 5 seconds),
+        # so the next chat turn usually finds one already open
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60),
+        retries=2  # Retry failed connection attempts
+    )
+)
+atexit.register(http_client.close)
+
+# Create one shared async HTTP client for Brave, BEA, BLS and Census.
+# These calls run on the background event loop (see run_async below) so
+# several of them can be in flight at the same time.
+async_http_client = httpx.AsyncClient(
+    # 10 seconds for each data API call, but only 3 to connect, so an
+    # unreachable host fails fast instead of using up the whole budget
+    timeout=httpx.Timeout(10.0, connect=3.0),
+    transport=httpx.AsyncHTTPTransport(
+        http2=HTTP2_AVAILABLE,
+        # Room for every gunicorn thread to have a few lookups in flight at once
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+        retries=2  # Retry failed connection attempts
+    )
+)
+
+# Create the OpenAI client once when the app starts
+# This client will be reused for all API requests (more efficient than creating it each time)
+# Every call gets our LLM_TIMEOUT deadline, and the SDK retries once on a
+# timeout. (These used to be set per call with with_options(), which built
+# a new copy of the client for every request.)
+openai_client = OpenAI(
+    api_key=OPENAI_API_KEY,
+    timeout=LLM_TIMEOUT,
+    max_retries=1,
+    http_client=http_client  # Share the pooled HTTP client
+)
+
+# The Anthropic client for Claude models is created on first use
+_anthropic_client = None
+_anthropic_client_lock = threading.Lock()
+_anthropic_import_failed = False
+
+
+def get_anthropic_client():
+    """
+    Return the shared Anthropic client, importing the SDK and creating the
+    client the first time it's needed.
+    
+    Returns:
+        The Anthropic client, or None if the anthropic package isn't installed
+        or ANTHROPIC_API_KEY isn't set
+    """
+    global _anthropic_client, _anthropic_import_failed
+    if _anthropic_client is not None or _anthropic_import_failed or not ANTHROPIC_API_KEY:
+        return _anthropic_client
+    
+    with _anthropic_client_lock:
+        if _anthropic_client is None and not _anthropic_import_failed:
+            try:
+                from anthropic import Anthropic
+            except ImportError:
+                _anthropic_import_failed = True
+                logging.warning("anthropic package not installed. Install with: pip install anthropic")
+                return None
+            _anthropic_client = Anthropic(
+                api_key=ANTHROPIC_API_KEY,
+                timeout=LLM_TIMEOUT,  # Our deadline for every call (see openai_client)
+                max_retries=1,        # Retry once on a timeout
+                http_client=http_client  # Share the pooled HTTP client
+            )
+    return _anthropic_client
+
+def warm_llm_connections():
+    """
+    Open connections to the AI providers before the first chat arrives.
+    
+    The first request to a host pays for the TCP and TLS handshakes; doing
+    that here means the first user doesn't. The requests carry no API key
+    and their responses are ignored - only the open connection, left in
+    http_client's pool, matters. Failures are ignored too (the real request
+    will just connect itself).
+    """
+    hosts = []
+    if OPENAI_API_KEY:
+        hosts.append("https://api.openai.com/v1/models")
+    if ANTHROPIC_API_KEY:
+        hosts.append("https://api.anthropic.com/v1/models")
+    for url in hosts:
+        try:
+            http_client.head(url, timeout=5.0)
+        except httpx.HTTPError as e:
+            logging.info("Couldn't pre-connect to %s: %s", url, e)
+
+
+# The AI model we'll use for all requests (default fallback)
+# gpt-4o is the GPT-4 flagship model - balanced performance and quality
+# This is used when no model is specified in the API request; set
+# OPENAI_MODEL to change it (read once here, like the other settings)
+MODEL = _env.get("OPENAI_MODEL", "gpt-4o")
+
+# What each model in the dropdown can do, worked out once at startup so
+# each request needs just one dictionary lookup:
+# - provider: "anthropic" or "openai" (which client and request format to use)
+# - max_output_tokens: the longest answer the model can write
+# - json_mode: whether it can be forced to reply with JSON (needed for "prompts")
+ModelInfo = namedtuple("ModelInfo", ["provider", "max_output_tokens", "json_mode"])
+
+MODEL_INFO = {
+    "gpt-4o": ModelInfo("openai", 16384, True),
+    "gpt-4o-mini": ModelInfo("openai", 16384, True),
+    "gpt-4-turbo": ModelInfo("openai", 4096, True),
+    # Claude models (only models that work with current API access)
+    "claude-3-5-haiku-20241022": ModelInfo("anthropic", 8192, False),  # Claude 3.5 Haiku (latest, fastest)
+    "claude-3-haiku-20240307": ModelInfo("anthropic", 4096, False),    # Claude 3 Haiku (stable)
+}
+
+# Any other model name (e.g., a newer GPT model in ?model=) is sent to OpenAI
+DEFAULT_MODEL_INFO = ModelInfo("openai", 4096, True)
+
+# Data source configuration
+# Each source has its URL, display name, pronoun replacements, and the
+# site: filter prefix that gets prepended to search queries
+SourceConfig = namedtuple("SourceConfig", ["url", "name", "your", "you", "site_prefix"])
+
+
+def make_source(url, name, your, you, site_prefix=None):
+    """Build a SourceConfig, precomputing its "site:<url> " search prefix."""
+    if site_prefix is None:
+        site_prefix = f"site:{url} "
+    return SourceConfig(url, name, your, you, site_prefix)
+
+
+# Maps source identifiers to their configuration
+DATA_SOURCES = {
+    "bryancounty": make_source(
+        url="bryancountyga.com",
+        name="Bryan County",
+        your="Bryan County's",
+        you="Bryan County"
+    ),
+    "savannah": make_source(
+        url="seda.org",
+        name="Chatham County",
+        your="Chatham County's",
+        you="Chatham County"
+    ),
+    "uwce": make_source(
+        url="uwce.org",
+        name="United Way of the Coastal Empire",
+        your="United Way of the Coastal Empire's",
+        you="United Way of the Coastal Empire"
+    ),
+    "fred": make_source(
+        url="fred.stlouisfed.org",
+        name="Federal Reserve Economic Data",
+        your="fred.stlouisfed.org's",
+        you="fred.stlouisfed.org"
+    ),
+    "gov": make_source(
+        url=".gov",
+        name="Government Sources",
+        your="government's",
+        you="the government"
+    ),
+    "datausa": make_source(
+        url="datausa.io",
+        name="Data USA",
+        your="Data USA's",
+        you="Data USA"
+    )
+}
+
+# The "all" source searches every site above (except .gov) at once
+# Its OR'd group of site: filters is built once here, e.g.
+# "(site:bryancountyga.com OR site:seda.org OR ... OR site:datausa.io)"
+_ALL_SOURCE_KEYS = ("bryancounty", "savannah", "uwce", "fred", "datausa")
+_ALL_SITES = "(" + " OR ".join(DATA_SOURCES[key].site_prefix.strip() for key in _ALL_SOURCE_KEYS) + ")"
+DATA_SOURCES["all"] = make_source(
+    url=_ALL_SITES,
+    name="All Sources",
+    your="these sources'",
+    you="these sources",
+    site_prefix=_ALL_SITES + " "  # The URL already contains the OR'd site: filters
+)
+
+# JSON parser for upstream API responses (both accept raw bytes)
+json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+
+def json_dumps(data):
+    """
+    Format data as compact JSON text (for logs, cached answers and prompts).
+    
+    Uses orjson when it's installed (several times faster); both versions
+    write non-ASCII characters as-is and leave out extra spaces.
+    
+    Args:
+        data: A JSON-serializable value
+    
+    Returns:
+        The JSON string
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def json_dumps_pretty(data):
+    """
+    Format data as indented JSON text (used to show API data to the model).
+    
+    Args:
+        data: A JSON-serializable value
+    
+    Returns:
+        The JSON string, indented by 2 spaces
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(data, indent=2)
+
+
+# Precompiled regular expressions used on every chat request
+# Compiling once at startup avoids re-parsing the patterns on each call
+
+# Matches the words "your" (group 1) and "you", so both are replaced in one pass
+_PRONOUN_RE = re.compile(r'\b(?:(your)|you)\b', re.IGNORECASE)
+
+# Keywords used to decide which economic data API can answer a question
+# Matching is by substring (so "job" also matches "jobs")
+INCOME_KEYWORDS = ('income', 'earnings', 'wage', 'salary')
+EMPLOYMENT_KEYWORDS = ('employment', 'unemployment', 'job', 'labor')
+GDP_KEYWORDS = ('gdp', 'gross domestic product', 'economic output')
+POPULATION_KEYWORDS = ('population', 'demographic')
+LOCATION_KEYWORDS = ('county', 'chatham', 'savannah', 'bryan', 'georgia', 'ga')
+ECONOMIC_SEARCH_KEYWORDS = ('income', 'wage', 'employment', 'unemployment', 'gdp', 'economy')
+
+
+def _keyword_regex(keywords):
+    """Compile a tuple of keywords into one case-insensitive regex that matches any of them."""
+    return re.compile("|".join(re.escape(word) for word in keywords), re.IGNORECASE)
+
+
+_ECONOMIC_SEARCH_RE = _keyword_regex(ECONOMIC_SEARCH_KEYWORDS)
+
+# Tags for every keyword that classify_query() looks for
+# (a keyword can have more than one tag, e.g. "savannah" is a location
+# and also means Chatham County)
+_KEYWORD_TAGS = {}
+for _tag, _keywords in (
+    ("income", INCOME_KEYWORDS),
+    ("employment", EMPLOYMENT_KEYWORDS),
+    ("gdp", GDP_KEYWORDS),
+    ("population", POPULATION_KEYWORDS),
+    ("location", LOCATION_KEYWORDS),
+    ("chatham", ('chatham', 'savannah')),  # Chatham County, GA (includes Savannah)
+    ("bryan", ('bryan',)),                 # Bryan County, GA
+):
+    for _word in _keywords:
+        _KEYWORD_TAGS.setdefault(_word, set()).add(_tag)
+
+# One regex that finds a year (e.g. 2022) and every keyword in a single pass
+# over the query. Longer keywords come first so "unemployment" wins over
+# "employment" when both match at the same position.
+_QUERY_SCAN_RE = re.compile(
+    r'\b(?P<year>20\d{2})\b|'
+    + "|".join(re.escape(word) for word in sorted(_KEYWORD_TAGS, key=len, reverse=True))
+)
+
+# Instructions added to the system prompt. They're the same on every request,
+# so they're built once here; {placeholders} are filled in with str.format()
+
+# After official data from one of the economic APIs
+API_DATA_INSTRUCTION = (
+    "\n\nData from {source} API:\n{data}\n\n"
+    "Use this official {source} data to answer the user's question. "
+    "The B19013_001E field contains the median household income value (5-year estimate). "
+    "When presenting numerical data, format them in **bold** using markdown for clarity. "
+    "Present your answer in a single paragraph without extra line breaks between sentences. "
+    "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
+    "After the factual answer, add an 'Insights' section with 2–4 concise bullet points."
+)
+
+# After Brave web search results
+SEARCH_RESULTS_INSTRUCTION = (
+    "\n\n{results}\n\n"
+    "Use these search results to answer the user's question. Cite sources with their URLs (the u fields) when possible. "
+    "When presenting numerical data (statistics, dollar amounts, percentages, years, etc.), format them in **bold** using markdown for clarity. "
+    "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
+    "CRITICAL: Only use numerical values that are EXPLICITLY stated in the search results. Do NOT estimate, interpolate, or make up numbers. "
+    "If the user asks for a single data point (e.g., 'What is the median income in 2022?') and you find it in the search results, provide it. "
+    "If the user asks for time-series data (e.g., income from 2015-2023) and year-by-year values are NOT in the search results, provide the link and say: 'We are currently unable to display the year-by-year data directly, but you can view the complete dataset at [link]. We are working on integrating directly with the U.S. Census Bureau to provide this data in future updates.' "
+    "After the factual answer, add an 'Insights' section with 2–4 concise bullet points that synthesize patterns, comparisons, trends, or implications grounded in the cited sources. "
+    "Do not invent facts; if the evidence is insufficient, state that explicitly."
+)
+
+# Claude: always encourage a concise Insights section, even without search
+CLAUDE_INSIGHTS_INSTRUCTION = (
+    "\n\nWhen you present the answer, keep it concise and clear. "
+    "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
+    "Then add an 'Insights' section with 2–4 bullets that provide thoughtful analysis grounded in the referenced sources. "
+    "Avoid speculation beyond the evidence."
+)
+
+# GPT: insights guidance when there's no API data or search results
+INSIGHTS_ONLY_INSTRUCTION = (
+    "After the factual answer, add an 'Insights' section with 2–4 concise bullet points that "
+    "synthesize patterns, comparisons, trends, or implications grounded in the provided sources or prior context. "
+    "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
+    "Do not invent facts; if evidence is insufficient, say so."
+)
+
+# Summary of old conversation turns trimmed off a long chat (see summarize_turns)
+HISTORY_SUMMARY_INSTRUCTION = (
+    "Summarize this earlier part of a conversation in under 150 words, for the assistant to continue from. "
+    "Keep the questions asked, the places and years discussed, and any numbers that were given. "
+    "Write plain sentences with no preamble."
+)
+
+# GPT: answer a numbered list of questions in one call (see answer_prompt_batch)
+BATCH_INSTRUCTION = (
+    "The user message is a JSON array of separate questions. Answer each one independently, "
+    "as you would if it had been asked on its own. "
+    'Reply with only a JSON object of the form {"answers": ["...", "..."]}, with exactly one answer '
+    "string per question, in the same order as the questions."
+)
+
+
+# ============================================================================
+# ASYNC HELPERS
+# ============================================================================
+
+# One long-lived asyncio event loop runs in a background thread for the
+# whole life of the process. Flask views stay synchronous and hand their
+# upstream API calls to this loop with run_async().
+#
+# Why not Flask's own "async def" views? Flask runs each async view in a
+# brand-new event loop that is thrown away when the request ends, which
+# would also throw away the pooled connections of async_http_client.
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+
+def get_event_loop():
+    """
+    Return the shared background event loop, starting it on first use.
+    
+    The loop is started lazily (not at import time) so that each gunicorn
+    worker process gets its own loop thread after it has been forked.
+    
+    Returns:
+        The running asyncio event loop
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="upstream-io", daemon=True).start()
+    return _event_loop
+
+
+def start_async(coro):
+    """
+    Start a coroutine on the shared background event loop without waiting
+    for it, so the calling thread can do other work in the meantime.
+    
+    Args:
+        coro: The coroutine to run (e.g., gather_context(query, source))
+    
+    Returns:
+        A concurrent.futures.Future; call .result() to wait for the value
+        (exceptions are re-raised there)
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_async(coro):
+    """
+    Run a coroutine on the shared background event loop and wait for its result.
+    
+    Args:
+        coro: The coroutine to run (e.g., brave_search("query"))
+    
+    Returns:
+        Whatever the coroutine returns (exceptions are re-raised here)
+    """
+    return start_async(coro).result()
+
+
+class UpstreamTimeout(Exception):
+    """Raised when an upstream API is still too slow after one retry."""
+
+
+async def call_with_timeout(make_coro, timeout, label):
+    """
+    Await a coroutine with a deadline, retrying once if it runs out of time.
+    
+    Args:
+        make_coro: Function that returns a fresh coroutine each time it's called
+            (a coroutine can only be awaited once, so the retry needs a new one)
+        timeout: Seconds to wait for each attempt
+        label: Name of the upstream API, for log messages
+    
+    Returns:
+        Whatever the coroutine returns
+    
+    Raises:
+        UpstreamTimeout: If both attempts time out
+    """
+    for attempt in (1, 2):
+        try:
+            return await asyncio.wait_for(make_coro(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning("%s timed out after %ss (attempt %d of 2)", label, timeout, attempt)
+    raise UpstreamTimeout(f"{label} timed out")
+
+
+def _close_async_http_client():
+    """Close the async HTTP client on the background loop when the process exits."""
+    if _event_loop is not None and _event_loop.is_running():
+        run_async(async_http_client.aclose())
+
+
+atexit.register(_close_async_http_client)
+
+
+# ============================================================================
+# RESPONSE CACHE
+# ============================================================================
+
+# How long a cached AI response stays valid, and how many we keep in memory
+LLM_CACHE_TTL = int(_env.get("LLM_CACHE_TTL", "3600"))   # Seconds (default 1 hour)
+LLM_CACHE_SIZE = int(_env.get("LLM_CACHE_SIZE", "1024"))  # Max number of responses
+
+# How long results from the economic data APIs (Census, BLS, BEA) are reused
+# Their data changes at most daily (ACS yearly, BLS monthly)
+API_CACHE_TTL = int(_env.get("API_CACHE_TTL", str(24 * 3600)))  # Seconds (default 1 day)
+API_CACHE_SIZE = int(_env.get("API_CACHE_SIZE", "512"))          # Max number of results
+
+# How long Brave Search results are reused for a repeated query
+# (the free tier is limited to 1 request per second)
+BRAVE_CACHE_TTL = int(_env.get("BRAVE_CACHE_TTL", "600"))    # Seconds (default 10 minutes)
+BRAVE_CACHE_SIZE = int(_env.get("BRAVE_CACHE_SIZE", "2048"))  # Max number of searches
+
+# How long a whole chat answer is reused when the exact same conversation is
+# sent again (skips the web search / API lookups as well as the AI call)
+RESPONSE_CACHE_TTL = int(_env.get("RESPONSE_CACHE_TTL", "300"))    # Seconds (default 5 minutes)
+RESPONSE_CACHE_SIZE = int(_env.get("RESPONSE_CACHE_SIZE", "1024"))  # Max number of answers
+
+# How similar a reworded question has to be (0-1, share of words in common)
+# to reuse a recent answer to the same conversation; 0 (the default) turns
+# this off. Word matching can still confuse two different questions, so
+# only switch it on after checking it against real questions.
+SEMANTIC_CACHE_THRESHOLD = float(_env.get("SEMANTIC_CACHE_THRESHOLD", "0"))
+
+# Where cached AI responses are saved so they survive restarts and redeploys
+# Set LLM_CACHE_DB to an empty value to keep the cache in memory only
+LLM_CACHE_DB = _env.get("LLM_CACHE_DB", str(Path(__file__).resolve().parent / ".cache" / "llm_cache.sqlite3"))
+
+# How much of the cache database file SQLite may memory-map (0 = off)
+DISK_CACHE_MMAP_BYTES = int(_env.get("DISK_CACHE_MMAP_BYTES", str(64 * 1024 * 1024)))  # Default 64 MB
+
+
+class LRUCache:
+    """
+    A small thread-safe in-memory cache with a size limit and expiry time.
+    
+    When the cache is full, the least recently used entry is dropped.
+    Entries older than `ttl` seconds are treated as missing.
+    """
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (timestamp, value)
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            timestamp, value = entry
+            if time.time() - timestamp > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)  # Mark as recently used
+            return value
+    
+    def put(self, key, value):
+        """Store value under key, evicting the oldest entry if the cache is full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class DiskCache:
+    """
+    A persistent cache stored in a SQLite database file.
+    
+    This sits behind the in-memory LRUCache: entries written here are still
+    available after the server restarts. The database is opened on first use
+    (so each gunicorn worker opens its own connection after forking). If the
+    file can't be opened, the disk cache turns itself off and logs a warning.
+    
+    Several caches can share one database file by using different tables,
+    and all gunicorn workers share the file, so an answer cached by one
+    worker is found by the others.
+    """
+    
+    def __init__(self, path, ttl, table="llm_cache"):
+        self.path = path
+        self.ttl = ttl
+        self.table = table  # Set by our own code, never from a request
+        self._conn = None
+        self._disabled = not path
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        """Open the database and create the cache table (called with the lock held)."""
+        if self._conn is None and not self._disabled:
+            try:
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                # isolation_level=None commits each statement immediately
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")    # Readers don't block the writer
+                conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, and much faster writes
+                # Read the file through a memory map, so lookups come straight
+                # from the OS page cache that every worker process shares
+                conn.execute(f"PRAGMA mmap_size={DISK_CACHE_MMAP_BYTES}")
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, ts REAL, value TEXT)")
+                self._conn = conn
+            except (OSError, sqlite3.Error) as e:
+                logging.warning("Disk cache disabled (%s): %s", self.path, e)
+                self._disabled = True
+        return self._conn
+    
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    f"SELECT value FROM {self.table} WHERE key = ? AND ts > ?",
+                    (key, time.time() - self.ttl)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logging.warning("Disk cache read failed: %s", e)
+                return None
+        return row[0] if row else None
+    
+    def put(self, key, value):
+        """Store value under key, replacing any older entry."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, ts, value) VALUES (?, ?, ?)",
+                    (key, time.time(), value)
+                )
+            except sqlite3.Error as e:
+                logging.warning("Disk cache write failed: %s", e)
+
+
+# Cache of AI responses, keyed by a hash of the model and the full prompt
+# Checked in memory first, then on disk
+llm_cache = LRUCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+llm_disk_cache = DiskCache(LLM_CACHE_DB, ttl=LLM_CACHE_TTL)
+
+
+def make_cache_key(*parts):
+    """
+    Build a deterministic cache key from JSON-serializable parts.
+    
+    Args:
+        *parts: Values that identify the request (model, system prompt, messages, ...)
+    
+    Returns:
+        Hex digest string that is identical for identical inputs
+    """
+    if ORJSON_AVAILABLE:
+        # Same bytes as the json.dumps() call below, several times faster on
+        # long conversations (this runs on every chat request)
+        serialized = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    else:
+        serialized = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(serialized, digest_size=16).hexdigest()
+
+
+def _cached_text(key):
+    """Look up a cached AI response in memory, then on disk (None if missing)."""
+    text = llm_cache.get(key)
+    if text is not None:
+        logging.info("LLM cache hit: %s", key)
+        return text
+    
+    text = llm_disk_cache.get(key)
+    if text is not None:
+        logging.info("LLM disk cache hit: %s", key)
+        llm_cache.put(key, text)  # Keep it in memory for next time
+    return text
+
+
+def _store_text(key, text):
+    """Save an AI response in both caches (empty responses are skipped)."""
+    if text:
+        llm_cache.put(key, text)
+        llm_disk_cache.put(key, text)
+
+
+# AI calls currently in flight, keyed by cache key, so identical prompts
+# arriving at the same time (from different gunicorn threads) share one call.
+# Each value is a Future that gets the response text.
+_llm_in_flight = {}
+_llm_in_flight_lock = threading.Lock()
+
+
+class _CallAbandoned(Exception):
+    """Set on an in-flight Future when its streaming request was closed early."""
+
+
+def _join_in_flight(key):
+    """
+    Find the in-flight AI call for key, or register this request as making it.
+    
+    Returns:
+        Tuple of (future, leader). When leader is True this request must make
+        the call and then resolve the future (see _finish_in_flight);
+        otherwise it can just wait for future.result().
+    """
+    with _llm_in_flight_lock:
+        future = _llm_in_flight.get(key)
+        if future is not None:
+            logging.info("LLM request already in flight, waiting for it: %s", key)
+            return future, False
+        future = _llm_in_flight[key] = Future()
+        return future, True
+
+
+def _finish_in_flight(key, future, text=None, error=None):
+    """Hand the leader's result (or error) to any waiting requests."""
+    with _llm_in_flight_lock:
+        _llm_in_flight.pop(key, None)
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(text)
+
+
+def _wait_in_flight(future):
+    """
+    Wait for another request's AI call. Returns None if that request was
+    closed before the answer finished, so this one should make its own call.
+    """
+    try:
+        return future.result()
+    except _CallAbandoned:
+        return None
+
+
+def cached_completion(key, create, model=""):
+    """
+    Return a cached AI response for key, or call create() and cache its result.
+    
+    If the same prompt is already being answered for another request, this
+    waits for that answer instead of calling the AI model a second time.
+    
+    Args:
+        key: Cache key from make_cache_key()
+        create: Function that calls the AI model and returns the response text
+        model: Model name, for the timing log message
+    
+    Returns:
+        The response text
+    """
+    text = _cached_text(key)
+    if text is not None:
+        return text
+    
+    future, leader = _join_in_flight(key)
+    if not leader:
+        text = _wait_in_flight(future)
+        if text is not None:
+            return text
+        return cached_completion(key, create, model)
+    
+    try:
+        start = time.perf_counter()
+        text = create()
+        logging.info("LLM timing: model=%s total_ms=%.1f chars=%d",
+                     model, (time.perf_counter() - start) * 1000, len(text or ""))
+        _store_text(key, text)
+    except BaseException as e:
+        _finish_in_flight(key, future, error=e if isinstance(e, Exception) else _CallAbandoned())
+        raise
+    _finish_in_flight(key, future, text=text)
+    return text
+
+
+def cached_completion_stream(key, stream, model=""):
+    """
+    Streaming version of cached_completion().
+    
+    Also logs the time to the first piece of text (ttft_ms) and to the
+    last one (total_ms), so slow starts from a provider show up in the logs.
+    
+    Args:
+        key: Cache key from make_cache_key() (shared with cached_completion,
+            so streamed and non-streamed requests reuse each other's answers)
+        stream: Function that calls the AI model and yields pieces of the response text
+        model: Model name, for the timing log message
+    
+    Yields:
+        Pieces of the response text (a cached response comes out as one piece)
+    """
+    text = _cached_text(key)
+    if text is not None:
+        yield text
+        return
+    
+    # Another request is already streaming this prompt: wait for its full
+    # answer and send it as one piece
+    future, leader = _join_in_flight(key)
+    if not leader:
+        text = _wait_in_flight(future)
+        if text is not None:
+            yield text
+        else:
+            yield from cached_completion_stream(key, stream, model)
+        return
+    
+    try:
+        start = time.perf_counter()
+        first_piece_at = None
+        pieces = []
+        for piece in stream():
+            if first_piece_at is None:
+                first_piece_at = time.perf_counter()
+            pieces.append(piece)
+            yield piece
+        
+        now = time.perf_counter()
+        logging.info("LLM timing: model=%s ttft_ms=%.1f total_ms=%.1f chars=%d",
+                     model, ((first_piece_at or now) - start) * 1000, (now - start) * 1000, sum(map(len, pieces)))
+        
+        # Only cache the response once it has arrived in full
+        text = "".join(pieces).strip()
+        _store_text(key, text)
+    except BaseException as e:
+        # GeneratorExit (the browser went away) lets the waiters call for themselves
+        _finish_in_flight(key, future, error=e if isinstance(e, Exception) else _CallAbandoned())
+        raise
+    _finish_in_flight(key, future, text=text)
+
+
+# Cache of finished chat answers ({"text": ..., "web": ...}), keyed by the
+# request itself (model, source, web flag and messages)
+# Checked in memory first, then in the same database file as the AI responses
+# (stored as JSON), so all workers share it and it survives restarts
+response_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+response_disk_cache = DiskCache(LLM_CACHE_DB, ttl=RESPONSE_CACHE_TTL, table="response_cache")
+
+# Words and numbers in a question, for SemanticCache
+# ("isn't" and "don't" are read as "is not" and "do not" first)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NOT_CONTRACTION_RE = re.compile(r"n't\b")
+
+# Filler words that don't change what a question asks for; they're left out
+# before comparing, so they can't make two different questions look alike
+_STOPWORDS = frozenset("""
+    a an the of in on at to for from by with and or is are was were be been
+    do does did what whats which who how many much me my our your their its
+    it this that these those there please tell show give about
+""".split())
+
+# Words that flip or narrow what a question asks for. Like numbers, two
+# questions only match when they contain exactly the same ones of these,
+# so "above the state average" never matches "not above the state average"
+_QUALIFIER_WORDS = frozenset("""
+    not no never none nor without except excluding exclude only
+    vs versus than above below over under more less fewer greater higher lower
+    most least top bottom before after since until between increase decrease
+    rise fall growth decline gain loss
+""".split())
+
 
-# Anthropic API client for Claude models
-try:
-    from anthropic import Anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ANTHROPIC_AVAILABLE = False
-    logging.warning("anthropic package not installed. Install with: pip install anthropic")
+class SemanticCache:
+    """
+    A cache of chat answers that also matches questions worded a little
+    differently ("what's bryan county's population" vs. "What is the
+    population of Bryan County?").
+    
+    Answers are grouped by a context key: the model, source, web flag and
+    the whole conversation before the latest question. Only the latest
+    question is compared. Two questions match when they share at least
+    `threshold` of their words (Jaccard similarity) and mention exactly the
+    same numbers and qualifier words, so "income in 2021" never matches
+    "income in 2022" and "above average" never matches "not above average".
+    Filler words ("the", "what", "of"...) aren't counted.
+    
+    Words are compared as sets, so word order and repeats are ignored;
+    that's why this is off unless SEMANTIC_CACHE_THRESHOLD is set.
+    """
+    
+    def __init__(self, threshold, maxsize, ttl, per_context=32):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.per_context = per_context  # Max answers kept for one conversation
+        self._groups = LRUCache(maxsize=maxsize, ttl=ttl)  # context key -> [(timestamp, words, must_match, value)]
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _words(question):
+        """
+        Split a question into its set of words (without filler words) and
+        the set of numbers and qualifier words that must match exactly.
+        """
+        text = _NOT_CONTRACTION_RE.sub(" not", question.lower())
+        words = frozenset(_WORD_RE.findall(text)) - _STOPWORDS
+        return words, frozenset(word for word in words if word.isdigit() or word in _QUALIFIER_WORDS)
+    
+    def get(self, context_key, question):
+        """Return the value cached for the most similar question, or None."""
+        if self.threshold <= 0:
+            return None
+        words, must_match = self._words(question)
+        if not words:
+            return None
+        
+        best, best_score = None, self.threshold
+        now = time.time()
+        with self._lock:
+            for timestamp, entry_words, entry_must_match, value in self._groups.get(context_key) or ():
+                if now - timestamp > self.ttl or entry_must_match != must_match:
+                    continue
+                score = len(words & entry_words) / len(words | entry_words)
+                if score >= best_score:
+                    best, best_score = value, score
+        return best
+    
+    def put(self, context_key, question, value):
+        """Remember value as the answer to question in this conversation."""
+        if self.threshold <= 0:
+            return
+        words, must_match = self._words(question)
+        if not words:
+            return
+        
+        now = time.time()
+        with self._lock:
+            entries = [entry for entry in self._groups.get(context_key) or () if now - entry[0] <= self.ttl]
+            entries.append((now, words, must_match, value))
+            self._groups.put(context_key, entries[-self.per_context:])
 
 
-# ============================================================================
-# CONFIGURATION & SETUP
-# ============================================================================
+# Cache of recent answers to reworded questions (see SemanticCache)
+semantic_cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
 
-# Load environment variables from the .env file in the same directory as this file
-# This lets us keep secrets (like API keys) out of the code
-dotenv_path = Path(__file__).resolve().parent / ".env"
-load_dotenv(dotenv_path=dotenv_path, override=True)
+# Everything needed to look up or store a finished chat answer:
+# - exact: response_cache key for the whole request
+# - context: semantic_cache key (the request without the latest question)
+# - question: the latest question, without the frontend's [INSTRUCTIONS: ...]
+#   (None when the conversation doesn't end with a user message)
+ResponseKey = namedtuple("ResponseKey", ["exact", "context", "question"])
 
-# Set up logging so we can see what's happening
-# INFO level means we'll see informational messages and errors
-logging.basicConfig(level=logging.INFO)
 
-# Check if the OpenAI API key is set and log a message
-if os.getenv("OPENAI_API_KEY"):
-    # Show first 7 characters of the key (for debugging) but hide the rest for security
-    logging.info("OPENAI_API_KEY detected: %s***", (os.getenv("OPENAI_API_KEY") or "")[:7])
-else:
-    # Warn if the API key is missing (the app won't work without it)
-    logging.warning("OPENAI_API_KEY not set")
+def make_response_key(model, source, use_web, messages, max_tokens):
+    """
+    Build the ResponseKey for a chat request.
+    
+    Args:
+        model: Model name
+        source: Data source identifier
+        use_web: Whether web search is enabled
+        messages: The conversation, exactly as the client sent it
+        max_tokens: Answer length limit (a shorter limit can cut answers off)
+    
+    Returns:
+        A ResponseKey
+    """
+    exact = make_cache_key("chat", model, source, use_web, messages, max_tokens)
+    last = messages[-1]
+    if not (isinstance(last, dict) and last.get("role") == "user" and isinstance(last.get("content"), str)):
+        return ResponseKey(exact, None, None)
+    
+    content = last["content"]
+    marker = content.find('[INSTRUCTIONS:')
+    question = content if marker < 0 else content[:marker]
+    # The instructions still go in the context key, since they differ by source
+    context = make_cache_key("chat-context", model, source, use_web, messages[:-1], content[len(question):], max_tokens)
+    return ResponseKey(exact, context, question)
 
-# Check if the Anthropic API key is set (for Claude models)
-if os.getenv("ANTHROPIC_API_KEY"):
-    logging.info("ANTHROPIC_API_KEY detected: %s***", (os.getenv("ANTHROPIC_API_KEY") or "")[:7])
-else:
-    logging.warning("ANTHROPIC_API_KEY not set (Claude models will not work)")
 
-# Check if Brave Search API key is set (for Claude web search)
-if os.getenv("BRAVE_API_KEY"):
-    logging.info("BRAVE_API_KEY detected: %s***", (os.getenv("BRAVE_API_KEY") or "")[:7])
-else:
-    logging.warning("BRAVE_API_KEY not set (Claude web search will not work)")
+def find_cached_response(key):
+    """
+    Look up a recent answer for this request: the exact same conversation
+    first, then the same conversation with a reworded last question.
+    
+    Args:
+        key: ResponseKey from make_response_key()
+    
+    Returns:
+        Tuple of (answer dict or None, "exact" / "semantic" / None)
+    """
+    result = response_cache.get(key.exact)
+    if result is not None:
+        return result, "exact"
+    stored = response_disk_cache.get(key.exact)
+    if stored is not None:
+        result = json_loads(stored)
+        response_cache.put(key.exact, result)  # Keep it in memory for next time
+        return result, "exact"
+    if key.question is not None:
+        result = semantic_cache.get(key.context, key.question)
+        if result is not None:
+            return result, "semantic"
+    return None, None
 
-# Initialize the Flask web application
-app = Flask(__name__)
 
-# Enable CORS (Cross-Origin Resource Sharing)
-# This allows the frontend JavaScript to call our API endpoints
-CORS(app)
+def remember_response(key, result):
+    """
+    Save a finished answer ({"text": ..., "web": ...}) in both response caches.
+    Empty answers aren't saved.
+    """
+    if not result["text"]:
+        return
+    response_cache.put(key.exact, result)
+    response_disk_cache.put(key.exact, json_dumps(result))
+    if key.question is not None:
+        semantic_cache.put(key.context, key.question, result)
 
-# Disable caching for development to prevent browser cache issues
-@app.after_request
-def add_header(response):
-    """Add cache control headers to prevent aggressive browser caching during development."""
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '-1'
-    return response
 
-# Create the OpenAI client once when the app starts
-# This client will be reused for all API requests (more efficient than creating it each time)
-# Set a longer timeout (10 minutes) to handle deep research models that take a long time
-openai_client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    timeout=600.0  # 10 minutes timeout for deep research models
-)
+def remember_streamed_response(key, pieces, web):
+    """
+    Pass streamed response pieces through, then save the full answer in
+    the response caches once the stream has finished.
+    
+    Args:
+        key: ResponseKey for this request
+        pieces: Iterator of response text pieces
+        web: Whether web search / API data was used
+    
+    Yields:
+        The same pieces, unchanged
+    """
+    parts = []
+    for piece in pieces:
+        parts.append(piece)
+        yield piece
+    
+    remember_response(key, {"text": "".join(parts).strip(), "web": web})
 
-# Create the Anthropic client for Claude models (if available)
-anthropic_client = None
-if ANTHROPIC_AVAILABLE and os.getenv("ANTHROPIC_API_KEY"):
-    anthropic_client = Anthropic(
-        api_key=os.getenv("ANTHROPIC_API_KEY"),
-        timeout=600.0  # 10 minutes timeout
-    )
 
-# The AI model we'll use for all requests (default fallback)
-# gpt-4o is the GPT-4 flagship model - balanced performance and quality
-# This is used when no model is specified in the API request
-MODEL = "gpt-4o"
+# Cache of economic data API results, shared by all the API helpers
+api_cache = LRUCache(maxsize=API_CACHE_SIZE, ttl=API_CACHE_TTL)
 
-# Claude model names mapping (only models that work with current API access)
-CLAUDE_MODELS = {
-    "claude-3-5-haiku-20241022",  # Claude 3.5 Haiku (latest, fastest)
-    "claude-3-haiku-20240307"     # Claude 3 Haiku (stable)
-}
+# Cache of Brave Search results, keyed by the exact query string and count
+brave_cache = LRUCache(maxsize=BRAVE_CACHE_SIZE, ttl=BRAVE_CACHE_TTL)
 
-# Data source configuration
-# Maps source identifiers to their URLs and pronoun replacements
-DATA_SOURCES = {
-    "bryancounty": {
-        "url": "bryancountyga.com",
-        "name": "Bryan County",
-        "your": "Bryan County's",
-        "you": "Bryan County"
-    },
-    "savannah": {
-        "url": "seda.org",
-        "name": "Chatham County",
-        "your": "Chatham County's",
-        "you": "Chatham County"
-    },
-    "uwce": {
-        "url": "uwce.org",
-        "name": "United Way of the Coastal Empire",
-        "your": "United Way of the Coastal Empire's",
-        "you": "United Way of the Coastal Empire"
-    },
-    "fred": {
-        "url": "fred.stlouisfed.org",
-        "name": "Federal Reserve Economic Data",
-        "your": "fred.stlouisfed.org's",
-        "you": "fred.stlouisfed.org"
-    },
-    "gov": {
-        "url": ".gov",
-        "name": "Government Sources",
-        "your": "government's",
-        "you": "the government"
-    },
-    "datausa": {
-        "url": "datausa.io",
-        "name": "Data USA",
-        "your": "Data USA's",
-        "you": "Data USA"
-    },
-    "all": {
-        "url": "(site:bryancountyga.com OR site:seda.org OR site:uwce.org OR site:fred.stlouisfed.org OR site:datausa.io)",
-        "name": "All Sources",
-        "your": "these sources'",
-        "you": "these sources"
-    }
-}
+
+def async_ttl_cache(cache):
+    """
+    Decorator that caches the results of an async function in `cache`.
+    
+    The cache key is built from the function name and all of its arguments.
+    None results (errors / no data) are not cached, so they are retried.
+    
+    Args:
+        cache: An LRUCache instance to store results in
+    
+    Returns:
+        The decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_cache_key(func.__name__, args, kwargs)
+            result = cache.get(key)
+            if result is not None:
+                logging.info("%s cache hit", func.__name__)
+                return result
+            
+            logging.info("%s cache miss", func.__name__)
+            result = await func(*args, **kwargs)
+            if result is not None:
+                cache.put(key, result)
+            return result
+        return wrapper
+    return decorator
 
 
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
+def find_last_user_message(messages):
+    """
+    Find the most recent user message in a conversation.
+    
+    Scans backwards by index, so the usual case (the last message is the
+    user's) is answered on the first check.
+    
+    Args:
+        messages: List of chat messages ({"role": ..., "content": ...} dicts)
+    
+    Returns:
+        The last message dict with role "user", or None if there isn't one
+    """
+    for i in range(len(messages) - 1, -1, -1):
+        msg = messages[i]
+        if isinstance(msg, dict) and msg.get("role") == "user":
+            return msg
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_encoding():
+    """
+    Load the tiktoken encoding once (None if tiktoken isn't installed or
+    its data file can't be downloaded).
+    
+    o200k_base is GPT-4o's encoding; for Claude it's a close enough estimate.
+    """
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning("tiktoken encoding unavailable, estimating tokens instead: %s", e)
+        return None
+
+
+def start_warmup():
+    """
+    Get the slow first-time work out of the way in background threads, so
+    the first chat request doesn't wait for it:
+    - load the tiktoken encoding (downloaded and parsed the first time)
+    - open connections to the AI providers (see warm_llm_connections)
+    
+    This isn't done at import, so scripts and tests that import app.py make
+    no network calls. gunicorn calls it in each worker process, after the
+    fork (see post_worker_init in gunicorn.conf.py) - connections opened
+    before the fork couldn't be used by the workers anyway. "python app.py"
+    calls it just before starting the development server.
+    """
+    if TIKTOKEN_AVAILABLE:
+        threading.Thread(target=get_token_encoding, name="tiktoken-warmup", daemon=True).start()
+    threading.Thread(target=warm_llm_connections, name="llm-warmup", daemon=True).start()
+
+
+def count_tokens(message):
+    """
+    Count (or estimate) the tokens a chat message takes up in a prompt.
+    
+    Args:
+        message: A {"role": ..., "content": ...} dict
+    
+    Returns:
+        Number of tokens, including a small per-message overhead
+    """
+    content = message.get("content", "")
+    if not isinstance(content, str):
+        content = str(content)
+    
+    encoding = get_token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(content, disallowed_special=())) + 4
+    return len(content) // 4 + 4  # About 4 characters per token in English
+
+
+def dedupe_messages(messages):
+    """
+    Drop repeated content from a conversation: a system prompt that was
+    already sent earlier in the list, and any message that's an exact copy
+    of the one right before it (e.g., a question resent after an error).
+    
+    Args:
+        messages: List of chat messages
+    
+    Returns:
+        The messages to send (the same list if nothing was dropped)
+    """
+    result = []
+    seen_system = set()
+    previous = None
+    for msg in messages:
+        if not isinstance(msg, dict):
+            continue
+        ident = (msg.get("role"), str(msg.get("content", "")))
+        if ident == previous or (ident[0] == "system" and ident[1] in seen_system):
+            continue
+        if ident[0] == "system":
+            seen_system.add(ident[1])
+        previous = ident
+        result.append(msg)
+    
+    if len(result) == len(messages):
+        return messages
+    logging.info("Dropped %d repeated messages", len(messages) - len(result))
+    return result
+
+
+def trim_history(messages, token_budget=HISTORY_TOKEN_BUDGET, block=1):
+    """
+    Drop the oldest turns of a long conversation so the prompt stays
+    within token_budget (a shorter prompt is cheaper and answered faster).
+    
+    System messages and the latest message are always kept; other
+    messages are kept newest first while they fit.
+    
+    Args:
+        messages: List of chat messages
+        token_budget: Max tokens for the whole conversation
+        block: Drop turns in multiples of this many, so the set of dropped
+            turns (and so its cached summary) stays the same for a few turns
+    
+    Returns:
+        Tuple of (messages to send, dropped turns). The messages are the
+        same list when nothing was dropped.
+    """
+    chat_messages = [m for m in messages if isinstance(m, dict)]
+    used = sum(count_tokens(m) for m in chat_messages if m.get("role") == "system")
+    
+    # Walk back from the latest message to find the oldest one that still fits
+    turns = [m for m in chat_messages if m.get("role") != "system"]
+    start = len(turns)
+    while start > 0:
+        used += count_tokens(turns[start - 1])
+        if used > token_budget and start < len(turns):
+            break
+        start -= 1
+    
+    if start > 0:
+        start = min(-(-start // block) * block, len(turns) - 1)  # Round up to a whole block
+    
+    # The kept history has to start with a user turn (Claude requires it)
+    while start < len(turns) - 1 and turns[start].get("role") != "user":
+        start += 1
+    
+    keep = {id(m) for m in turns[start:]}
+    trimmed = [m for m in chat_messages if m.get("role") == "system" or id(m) in keep]
+    if len(trimmed) == len(messages):
+        return messages, []
+    logging.info("Trimmed conversation from %d to %d messages", len(messages), len(trimmed))
+    return trimmed, turns[:start]
+
+
+def summarize_turns(turns):
+    """
+    Summarize conversation turns that were trimmed off, so the model keeps
+    the gist of them for a fraction of the tokens.
+    
+    Uses the small HISTORY_SUMMARY_MODEL and the usual AI response caches,
+    so each block of old turns is only summarized once.
+    
+    Args:
+        turns: The dropped user/assistant messages, oldest first
+    
+    Returns:
+        The summary text, or None if summaries are off or the call failed
+    """
+    if not (HISTORY_SUMMARY_MODEL and OPENAI_API_KEY):
+        return None
+    
+    transcript = "\n\n".join(f"{m.get('role')}: {m.get('content', '')}" for m in turns)
+    
+    def create_summary():
+        try:
+            chat = openai_client.chat.completions.create(
+                model=HISTORY_SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": HISTORY_SUMMARY_INSTRUCTION},
+                    {"role": "user", "content": transcript}
+                ],
+                temperature=0,
+                max_tokens=300
+            )
+        except APITimeoutError as e:
+            raise UpstreamTimeout("OpenAI timed out") from e
+        return (chat.choices[0].message.content or "").strip()
+    
+    key = make_cache_key("history-summary", HISTORY_SUMMARY_MODEL, turns)
+    try:
+        return cached_completion(key, create_summary, model=HISTORY_SUMMARY_MODEL) or None
+    except Exception as e:
+        # The summary is only a bonus; without it the old turns are just dropped
+        logging.warning("Could not summarize earlier conversation: %s", e)
+        return None
+
+
+def compact_history(messages):
+    """
+    Shrink the conversation before it's sent to the AI model: drop repeated
+    messages, trim the oldest turns to fit HISTORY_TOKEN_BUDGET, and put a
+    short summary of the trimmed turns in their place.
+    
+    Args:
+        messages: List of chat messages (not modified)
+    
+    Returns:
+        The messages to send
+    """
+    messages = dedupe_messages(messages)
+    block = HISTORY_SUMMARY_BLOCK if HISTORY_SUMMARY_MODEL else 1
+    messages, dropped = trim_history(messages, block=block)
+    if not dropped:
+        return messages
+    
+    summary = summarize_turns(dropped)
+    if summary:
+        # After the system prompt(s), before the turns that were kept
+        insert_at = next((i for i, m in enumerate(messages) if m.get("role") != "system"), len(messages))
+        messages.insert(insert_at, {"role": "system", "content": "Summary of the earlier conversation: " + summary})
+    return messages
+
+
+# The message roles both AI providers accept
+VALID_ROLES = frozenset({"system", "user", "assistant"})
+
+
+def validate_messages(messages):
+    """
+    Check that the conversation the client sent has the right shape.
+    
+    One quick pass over the list, so a malformed request is turned away
+    here instead of failing at OpenAI or Anthropic after a slow round-trip.
+    
+    Args:
+        messages: The "messages" value from the request body
+    
+    Returns:
+        None if it's valid, otherwise an error message for the client
+    """
+    if not isinstance(messages, list) or not messages:
+        return "messages[] required"
+    for i, message in enumerate(messages):
+        if not isinstance(message, dict) or message.get("role") not in VALID_ROLES:
+            return f"messages[{i}] must have a role of system, user or assistant"
+        if not isinstance(message.get("content"), str):
+            return f"messages[{i}].content must be a string"
+    return None
+
+
+# Messages that are only a greeting or a thank-you ("hi!", "Thanks so much")
+_SMALL_TALK_RE = re.compile(
+    r"^\s*(?:(hi|hello|hey|howdy|good (?:morning|afternoon|evening))|(thanks|thank you|thx|ty))"
+    r"(?:\s+(?:so much|a lot|very much|eugene|there))*\s*[!.]*\s*$",
+    re.IGNORECASE
+)
+
+GREETING_REPLY = (
+    "Hi! I'm Eugene 🦭. Ask me about population, income, jobs or the economy in "
+    "Bryan County, Savannah and the region, and I'll look up the latest numbers."
+)
+THANKS_REPLY = "You're welcome! Let me know if there's anything else you'd like to look up. 🦭"
+
+
+def direct_reply(messages):
+    """
+    Answer the latest message without searching or calling the AI model,
+    when it doesn't need either.
+    
+    Cheap checks for messages that are empty, too long, or just a greeting
+    or thank-you. Everything else returns None and goes to the model.
+    
+    Args:
+        messages: The conversation, as the client sent it
+    
+    Returns:
+        None, or a tuple of (reason, status code, response dict) where
+        reason is "empty", "too_long" or "small_talk" (for the request log)
+    """
+    last = messages[-1]
+    if not (isinstance(last, dict) and last.get("role") == "user" and isinstance(last.get("content"), str)):
+        return None
+    
+    content = last["content"]
+    marker = content.find('[INSTRUCTIONS:')
+    question = (content if marker < 0 else content[:marker]).strip()
+    
+    if not question:
+        return ("empty", 400, {"error": "message is empty"})
+    if len(question) > MAX_QUESTION_CHARS:
+        return ("too_long", 413, {"error": f"message is too long (max {MAX_QUESTION_CHARS} characters)"})
+    
+    match = _SMALL_TALK_RE.match(question)
+    if match:
+        return ("small_talk", 200, {"text": GREETING_REPLY if match.group(1) else THANKS_REPLY, "web": False})
+    return None
+
+
+def clean_search_query(raw_query, source):
+    """
+    Turn the user's message into a search query.
+    
+    Cuts off the [INSTRUCTIONS: ...] block the frontend appends (everything
+    from the marker on) and substitutes pronouns for the data source.
+    
+    Args:
+        raw_query: The content of the user's latest message
+        source: Data source identifier (e.g., "all", "bryancounty")
+    
+    Returns:
+        The cleaned-up search query
+    """
+    marker = raw_query.find('[INSTRUCTIONS:')
+    if marker >= 0:
+        raw_query = raw_query[:marker]
+    return substitute_pronouns(raw_query.strip(), source)
+
+
+def classify_query(query_lower):
+    """
+    Scan a lowercased query once for economic-data keywords and a year.
+    
+    Args:
+        query_lower: The user's query, already lowercased
+    
+    Returns:
+        Tuple of (tags, year) where tags is a set like {"income", "location",
+        "chatham"} and year is the first year found as an int (or None)
+    """
+    tags = set()
+    year = None
+    for match in _QUERY_SCAN_RE.finditer(query_lower):
+        if match.lastgroup == "year":
+            if year is None:
+                year = int(match.group("year"))
+        else:
+            tags |= _KEYWORD_TAGS[match.group()]
+    return tags, year
+
+
 def substitute_pronouns(query, source):
     """
     Substitute pronouns in the query based on the data source.
@@ -186,16 +1702,13 @@ def substitute_pronouns(query, source):
     Returns:
         Query with pronouns replaced
     """
-    if source not in DATA_SOURCES:
+    config = DATA_SOURCES.get(source)
+    if config is None:
         return query
     
-    config = DATA_SOURCES[source]
-    
     # Replace "your" and "you" with source-specific terms
-    query = re.sub(r'\byour\b', config["your"], query, flags=re.IGNORECASE)
-    query = re.sub(r'\byou\b', config["you"], query, flags=re.IGNORECASE)
-    
-    return query
+    # (a function replacement also means the terms are inserted literally)
+    return _PRONOUN_RE.sub(lambda match: config.your if match.group(1) else config.you, query)
 
 
 def apply_site_filter(query, source):
@@ -209,50 +1722,105 @@ def apply_site_filter(query, source):
     Returns:
         Query with site: filter prepended
     """
-    if source not in DATA_SOURCES:
+    config = DATA_SOURCES.get(source)
+    if config is None:
         return query
     
-    config = DATA_SOURCES[source]
+    # The prefix is precomputed (for "all" it is the OR'd group of sites)
+    return config.site_prefix + query
+
+
+# Brave requests currently in flight, keyed by (query, count), so identical
+# searches started at the same time share one request. Everything here runs
+# on the single background event loop, so no locks are needed.
+_brave_in_flight = {}
+_brave_semaphore = asyncio.Semaphore(BRAVE_CONCURRENCY)
+_brave_next_start = 0.0  # time.monotonic() value when the next request may start
+
+# The Brave endpoint, headers and fixed parameters never change, so they're built once here
+# instead of on every search (requests go over the pooled async_http_client)
+BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+_BRAVE_HEADERS = {
+    "Accept": "application/json",
+    # Ask for brotli (smaller than gzip) only if we can decode it
+    "Accept-Encoding": "br, gzip" if BROTLI_AVAILABLE else "gzip",
+    "X-Subscription-Token": BRAVE_API_KEY or ""
+}
+_BRAVE_PARAMS = {
+    "result_filter": "web"  # Only web results (skip news, videos, etc.)
+}
+
+
+async def brave_search(query, count=BRAVE_RESULT_COUNT):
+    """
+    Search the web using Brave Search API.
+    
+    Queries that differ only in spacing ("Bryan County  jobs " vs.
+    "Bryan County jobs") share one cache entry and one request. Case is
+    kept, since Brave's OR operator only works in capitals.
+    
+    Args:
+        query: The search query string
+        count: Number of results to return (default BRAVE_RESULT_COUNT)
     
-    # For "all" source, the URL already contains the OR logic
-    if source == "all":
-        return f"{config['url']} {query}"
+    Returns:
+        List of search results with title, url, and description,
+        or None if the search failed
+    """
+    return await _brave_search(" ".join(query.split()), count)
+
+
+@async_ttl_cache(brave_cache)
+async def _brave_search(query, count):
+    """
+    Cached, de-duplicated Brave Search for an already normalized query
+    (see brave_search()). Failures return None, so they aren't cached.
+    """
+    key = (query, count)
+    task = _brave_in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_brave_request(query, count))
+        _brave_in_flight[key] = task
+        task.add_done_callback(lambda _: _brave_in_flight.pop(key, None))
     else:
-        return f"site:{config['url']} {query}"
+        logging.info("Brave Search already in flight, waiting for it: %s", query)
+    
+    # shield() keeps the shared request going if just one caller is cancelled
+    return await asyncio.shield(task)
 
 
-def brave_search(query, count=10):
+async def _brave_request(query, count):
     """
-    Search the web using Brave Search API.
+    Send one request to Brave Search, respecting the rate limit.
     
     Args:
         query: The search query string
-        count: Number of results to return (default 10)
+        count: Number of results to return
     
     Returns:
-        List of search results with title, url, and description
+        List of search results, or None if the search failed
     """
-    api_key = os.getenv("BRAVE_API_KEY")
-    if not api_key:
+    global _brave_next_start
+    
+    if not BRAVE_API_KEY:
         logging.warning("BRAVE_API_KEY not set, cannot perform web search")
         return []
     
     try:
-        url = "https://api.search.brave.com/res/v1/web/search"
-        headers = {
-            "Accept": "application/json",
-            "Accept-Encoding": "gzip",
-            "X-Subscription-Token": api_key
-        }
-        params = {
-            "q": query,
-            "count": count
-        }
+        params = {"q": query, "count": count, **_BRAVE_PARAMS}
         
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        async with _brave_semaphore:
+            # Reserve the next start time, then wait for it
+            now = time.monotonic()
+            wait = _brave_next_start - now
+            _brave_next_start = max(now, _brave_next_start) + BRAVE_MIN_INTERVAL
+            if wait > 0:
+                await asyncio.sleep(wait)
+            
+            response = await async_http_client.get(BRAVE_SEARCH_URL, headers=_BRAVE_HEADERS, params=params)
         response.raise_for_status()
         
-        data = response.json()
+        data = json_loads(response.content)
         results = []
         
         # Extract web results
@@ -263,17 +1831,27 @@ def brave_search(query, count=10):
                 "description": item.get("description", "")
             })
         
-        logging.info(f"Brave Search returned {len(results)} results for: {query}")
+        logging.info("Brave Search returned %d results for: %s", len(results), query)
         return results
         
     except Exception as e:
-        logging.error(f"Brave Search error: {e}")
-        return []
+        logging.error("Brave Search error: %s", e)
+        return None
+
+
+# Brave highlights the matching words in snippets with <strong> tags
+_SNIPPET_TAG_RE = re.compile(r"</?strong>")
 
 
 def format_search_results(results):
     """
-    Format search results into a readable string for the AI.
+    Format search results for the AI as one compact line of JSON.
+    
+    Short keys and no extra whitespace use far fewer prompt tokens than
+    the numbered "Title / URL: ..." list this used to build, and the model
+    reads JSON just as well. Long titles are cut short and highlight tags
+    are dropped; snippets are otherwise kept whole, since they're where
+    the numbers are.
     
     Args:
         results: List of search result dictionaries
@@ -284,16 +1862,16 @@ def format_search_results(results):
     if not results:
         return "No search results found."
     
-    formatted = "Here are the web search results:\n\n"
-    for i, result in enumerate(results, 1):
-        formatted += f"{i}. {result['title']}\n"
-        formatted += f"   URL: {result['url']}\n"
-        formatted += f"   {result['description']}\n\n"
-    
-    return formatted
+    compact = [
+        {"t": result["title"][:120], "u": result["url"], "s": _SNIPPET_TAG_RE.sub("", result["description"])}
+        for result in results
+    ]
+    return ("Web search results (JSON; t = title, u = URL, s = snippet):\n"
+            + json_dumps(compact))
 
 
-def bea_api_search(dataset, table, geography, year=None):
+@async_ttl_cache(api_cache)
+async def bea_api_search(dataset, table, geography, year=None):
     """
     Fetch data from the Bureau of Economic Analysis (BEA) API.
     
@@ -306,15 +1884,13 @@ def bea_api_search(dataset, table, geography, year=None):
     Returns:
         Dictionary with BEA data or None if error
     """
-    api_key = os.getenv("BEA_API_KEY")
-    if not api_key:
-        logging.warning("BEA_API_KEY not set, cannot fetch BEA data")
+    if not BEA_API_KEY:  # Already warned about at startup
         return None
     
     try:
         url = "https://apps.bea.gov/api/data"
         params = {
-            "UserID": api_key,
+            "UserID": BEA_API_KEY,
             "method": "GetData",
             "datasetname": dataset,
             "TableName": table,
@@ -323,62 +1899,117 @@ def bea_api_search(dataset, table, geography, year=None):
             "ResultFormat": "JSON"
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = await async_http_client.get(url, params=params)
         response.raise_for_status()
-        data = response.json()
+        data = json_loads(response.content)
         
         if data.get("BEAAPI", {}).get("Results"):
-            logging.info(f"BEA API returned data for {dataset}/{table}")
+            logging.info("BEA API returned data for %s/%s", dataset, table)
             return data["BEAAPI"]["Results"]
         return None
         
     except Exception as e:
-        logging.error(f"BEA API error: {e}")
+        logging.error("BEA API error: %s", e)
         return None
 
 
-def bls_api_search(series_ids, start_year=None, end_year=None):
+# BLS accepts up to 50 series IDs in a single request
+BLS_MAX_SERIES_PER_REQUEST = 50
+
+
+async def _bls_request(series_ids, start_year, end_year):
     """
-    Fetch data from the Bureau of Labor Statistics (BLS) API.
+    Send one request to the BLS API for a batch of series.
     
     Args:
-        series_ids: List of BLS series IDs (e.g., ['LAUCN130510000000003'] for unemployment)
-        start_year: Start year (optional)
-        end_year: End year (optional)
-        
+        series_ids: List of up to BLS_MAX_SERIES_PER_REQUEST series IDs
+        start_year: Start year
+        end_year: End year
+    
     Returns:
-        Dictionary with BLS data or None if error
+        List of series dictionaries, or None if error
     """
-    api_key = os.getenv("BLS_API_KEY")
-    # BLS API works without key but has lower rate limits
+    # BLS API works without key (BLS_API_KEY) but has lower rate limits
     
     try:
         url = "https://api.bls.gov/publicAPI/v2/timeseries/data/"
         
         payload = {
             "seriesid": series_ids,
-            "startyear": start_year or str(datetime.now().year - 5),
-            "endyear": end_year or str(datetime.now().year)
+            "startyear": start_year,
+            "endyear": end_year
         }
         
-        if api_key:
-            payload["registrationkey"] = api_key
+        if BLS_API_KEY:
+            payload["registrationkey"] = BLS_API_KEY
         
-        response = requests.post(url, json=payload, timeout=10)
+        response = await async_http_client.post(url, json=payload)
         response.raise_for_status()
-        data = response.json()
+        data = json_loads(response.content)
         
         if data.get("status") == "REQUEST_SUCCEEDED":
-            logging.info(f"BLS API returned data for {len(series_ids)} series")
+            logging.info("BLS API returned data for %d series", len(series_ids))
             return data.get("Results", {}).get("series", [])
         return None
         
-    except Exception as e:
-        logging.error(f"BLS API error: {e}")
-        return None
+    except Exception as e:
+        logging.error("BLS API error: %s", e)
+        return None
+
+
+async def bls_api_search(series_ids, start_year=None, end_year=None):
+    """
+    Fetch data from the Bureau of Labor Statistics (BLS) API.
+    
+    All requested series are fetched in as few requests as possible (one
+    request per 50 series). Each series is cached on its own, so a later
+    question that needs only some of the same series doesn't call BLS again.
+    
+    Args:
+        series_ids: List of BLS series IDs (e.g., ['LAUCN130510000000003'] for unemployment)
+        start_year: Start year (optional)
+        end_year: End year (optional)
+        
+    Returns:
+        List of series dictionaries (in the order requested) or None if error
+    """
+    start_year = start_year or str(datetime.now().year - 5)
+    end_year = end_year or str(datetime.now().year)
+    
+    def series_cache_key(series_id):
+        return make_cache_key("bls_series", series_id, start_year, end_year)
+    
+    # Use cached series where we have them and only ask BLS for the rest
+    found = {}
+    missing = []
+    for series_id in dict.fromkeys(series_ids):  # Drop duplicates, keep order
+        cached = api_cache.get(series_cache_key(series_id))
+        if cached is not None:
+            found[series_id] = cached
+        else:
+            missing.append(series_id)
+    
+    if found:
+        logging.info("BLS cache hit for %d of %d series", len(found), len(found) + len(missing))
+    
+    if missing:
+        batches = [
+            missing[i:i + BLS_MAX_SERIES_PER_REQUEST]
+            for i in range(0, len(missing), BLS_MAX_SERIES_PER_REQUEST)
+        ]
+        responses = await asyncio.gather(*(_bls_request(batch, start_year, end_year) for batch in batches))
+        for series_list in responses:
+            for series in series_list or []:
+                series_id = series.get("seriesID")
+                found[series_id] = series
+                api_cache.put(series_cache_key(series_id), series)
+    
+    results = [found[series_id] for series_id in series_ids if series_id in found]
+    return results or None
 
 
-def census_acs_search(geography_type, geography_id, variables, year=2022):
+@async_ttl_cache(api_cache)
+async def census_acs_search(geography_type, geography_id, variables, year=2022):
     """
     Fetch data from the Census Bureau's American Community Survey (ACS) 5-Year Estimates API.
     
@@ -391,9 +2022,7 @@ def census_acs_search(geography_type, geography_id, variables, year=2022):
     Returns:
         Dictionary with variable data or None if error
     """
-    api_key = os.getenv("CENSUS_API_KEY")
-    if not api_key:
-        logging.warning("CENSUS_API_KEY not set, cannot fetch Census data")
+    if not CENSUS_API_KEY:  # Already warned about at startup
         return None
     
     try:
@@ -409,7 +2038,7 @@ def census_acs_search(geography_type, geography_id, variables, year=2022):
         
         params = {
             "get": variables_str,
-            "key": api_key
+            "key": CENSUS_API_KEY
         }
         
         # Handle geography specification
@@ -420,10 +2049,10 @@ def census_acs_search(geography_type, geography_id, variables, year=2022):
         else:
             params["for"] = f"{geography_type}:{geography_id}"
         
-        response = requests.get(url, params=params, timeout=10)
+        response = await async_http_client.get(url, params=params)
         response.raise_for_status()
         
-        data = response.json()
+        data = json_loads(response.content)
         if len(data) < 2:
             return None
         
@@ -436,17 +2065,89 @@ def census_acs_search(geography_type, geography_id, variables, year=2022):
             if i < len(values):
                 result[header] = values[i]
         
-        logging.info(f"Census ACS API returned data for {result.get('NAME', 'unknown')}")
+        logging.info("Census ACS API returned data for %s", result.get('NAME', 'unknown'))
         return result
         
     except Exception as e:
-        logging.error(f"Census ACS API error: {e}")
+        logging.error("Census ACS API error: %s", e)
         return None
 
 
-def fetch_economic_data(query, location=None):
+def plan_economic_lookups(query):
+    """
+    Work out which economic data API lookups match a question, without
+    sending anything yet.
+    
+    gather_context() uses this to tell whether the APIs might answer at all
+    before deciding how to run the web search (see there), and
+    fetch_economic_data() runs the lookups it returns.
+    
+    Args:
+        query: User's question/query
+    
+    Returns:
+        List of (api_name, make_lookup) in priority order, where
+        make_lookup() returns the coroutine that does the lookup.
+        Empty if no API covers this question.
+    """
+    query_lower = query.lower()
+    
+    # Find the year and the keywords in one pass over the query
+    tags, year = classify_query(query_lower)
+    
+    # Detect year in query (e.g., "2022", "in 2023", "for 2021")
+    requested_year = year or 2023  # Default to 2023
+    
+    # Detect what kind of economic data is being requested
+    is_income = "income" in tags
+    is_employment = "employment" in tags
+    is_gdp = "gdp" in tags
+    is_population = "population" in tags
+    
+    # Detect location from query text (not dropdown value)
+    has_location = "location" in tags
+    is_chatham = "chatham" in tags  # Chatham County, GA (includes Savannah)
+    is_bryan = "bryan" in tags      # Bryan County, GA
+    
+    lookups = []
+    
+    # ACS for demographic/income data
+    if (is_income or is_population) and has_location:
+        variables = []
+        if is_income:
+            variables.append('B19013_001E')  # Median household income
+        if is_population:
+            variables.append('B01003_001E')  # Total population
+        
+        # Map common county names to FIPS codes
+        if is_chatham:
+            lookups.append(('ACS', lambda: census_acs_search('county', '13:051', variables, year=requested_year)))
+        elif is_bryan:
+            lookups.append(('ACS', lambda: census_acs_search('county', '13:029', variables, year=requested_year)))
+    
+    # BLS for employment data
+    # (every county mentioned in the query is fetched in a single BLS request)
+    if is_employment and has_location:
+        series_ids = []
+        if is_chatham:
+            series_ids.append('LAUCN130510000000003')  # Chatham County, GA unemployment
+        if is_bryan:
+            series_ids.append('LAUCN130290000000003')  # Bryan County, GA unemployment
+        
+        if series_ids:
+            lookups.append(('BLS', lambda: bls_api_search(series_ids)))
+    
+    # BEA for GDP/economic data
+    if is_gdp and has_location:
+        lookups.append(('BEA', lambda: bea_api_search('Regional', 'CAGDP1', 'COUNTY')))
+    
+    return lookups
+
+
+async def fetch_economic_data(query, location=None):
     """
-    Smart economic data fetcher that tries multiple APIs in order:
+    Smart economic data fetcher that queries multiple APIs at the same time
+    and uses the first one (in this priority order) that returns data:
     1. ACS (American Community Survey / Census) - for income/demographic data
     2. BLS (Bureau of Labor Statistics) - for employment data
     3. BEA (Bureau of Economic Analysis) - for GDP data
@@ -460,108 +2161,389 @@ def fetch_economic_data(query, location=None):
         Tuple of (data, source) where data is the API response and source is the API name,
         or (None, None) if no API data found
     """
-    print(f"\n===== fetch_economic_data called =====")
-    print(f"Query: '{query}'")
-    print(f"Location: '{location}'")
-    logging.info(f"===== fetch_economic_data called with query: '{query}', location: '{location}' =====")
-    query_lower = query.lower()
+    logging.info("===== fetch_economic_data called with query: '%s', location: '%s' =====", query, location)
     
-    # Detect year in query (e.g., "2022", "in 2023", "for 2021")
-    import re
-    year_match = re.search(r'\b(20\d{2})\b', query)
-    requested_year = int(year_match.group(1)) if year_match else 2023  # Default to 2023
-    print(f">>> Detected year: {requested_year}")
+    # The API lookups that match the query, in priority order
+    # (nothing is sent until they're gathered below)
+    attempts = [(api_name, make_lookup()) for api_name, make_lookup in plan_economic_lookups(query)]
+    if attempts:
+        logging.info("Attempting APIs: %s", ", ".join(api_name for api_name, _ in attempts))
     
-    # Detect what kind of economic data is being requested
-    is_income = any(word in query_lower for word in ['income', 'earnings', 'wage', 'salary'])
-    is_employment = any(word in query_lower for word in ['employment', 'unemployment', 'job', 'labor'])
-    is_gdp = any(word in query_lower for word in ['gdp', 'gross domestic product', 'economic output'])
-    is_population = any(word in query_lower for word in ['population', 'demographic'])
+    # Run all matching lookups at the same time, so the total wait is the
+    # slowest single API instead of the sum of all of them
+    results = await asyncio.gather(*(coro for _, coro in attempts), return_exceptions=True)
     
-    # Detect location from query text (not dropdown value)
-    has_location = any(word in query_lower for word in ['county', 'chatham', 'savannah', 'bryan', 'georgia', 'ga'])
+    # Use the highest-priority API that returned data
+    for (api_name, _), result in zip(attempts, results):
+        if isinstance(result, Exception):
+            logging.error("%s attempt failed: %s", api_name, result)
+        elif result:
+            logging.info("%s API SUCCESS: %s", api_name, result)
+            return (result, api_name)
     
-    # Try ACS first for demographic/income data
-    if (is_income or is_population) and has_location:
+    # No API data found
+    logging.info("No economic API data found, will fall back to web search")
+    return (None, None)
+
+
+async def web_search(search_query, source):
+    """
+    Search the web with Brave, filtered to the selected data source.
+    
+    Args:
+        search_query: The cleaned-up user question (pronouns already substituted)
+        source: Data source identifier (e.g., "all", "bryancounty")
+    
+    Returns:
+        List of search results (may be empty or None)
+    
+    Raises:
+        UpstreamTimeout: If Brave is too slow even after a retry
+    """
+    # Add site: filter based on source parameter
+    search_query = apply_site_filter(search_query, source)
+    
+    # If no specific source, prioritize DataUSA and FRED for economic queries
+    if source == 'all' and _ECONOMIC_SEARCH_RE.search(search_query):
+        # Search DataUSA and FRED at the same time
+        logging.info("Trying DataUSA and FRED for economic data: %s", search_query)
+        results = await asyncio.gather(
+            call_with_timeout(
+                lambda: brave_search(f"site:datausa.io {search_query}", count=5), SEARCH_TIMEOUT, "Brave Search (DataUSA)"
+            ),
+            call_with_timeout(
+                lambda: brave_search(f"site:fred.stlouisfed.org {search_query}", count=5), SEARCH_TIMEOUT, "Brave Search (FRED)"
+            ),
+            return_exceptions=True
+        )
+        
+        # One search timing out is fine as long as the other came back
+        # (brave_search handles its own errors, so timeouts are the only exceptions here)
+        if all(isinstance(r, UpstreamTimeout) for r in results):
+            raise results[0]
+        datausa_results, fred_results = (None if isinstance(r, Exception) else r for r in results)
+        
+        # Prefer DataUSA, unless it has fewer than 2 results and FRED has some
+        search_results = datausa_results
+        if (not search_results or len(search_results) < 2) and fred_results:
+            search_results = fred_results
+    else:
+        logging.info("Performing Brave Search: %s", search_query)
+        search_results = await call_with_timeout(
+            lambda: brave_search(search_query), SEARCH_TIMEOUT, "Brave Search"
+        )
+    
+    return search_results
+
+
+async def gather_context(search_query, source):
+    """
+    Look up everything needed to answer a question, in one coroutine:
+    the economic data APIs first, then Brave web search if they have nothing.
+    
+    Both the Claude and GPT handlers use this, and it runs on the background
+    event loop with a single run_async() call per chat request.
+    
+    Args:
+        search_query: The cleaned-up user question (pronouns already substituted)
+        source: Data source identifier (e.g., "all", "bryancounty")
+    
+    Returns:
+        Tuple of (api_data, api_source, search_results). Either the first two
+        are set (official API data) or search_results is (web search), or
+        all are empty/None if nothing was found.
+    """
+    # Questions no economic data API covers go straight to web search
+    if not plan_economic_lookups(search_query):
+        return (None, None, await web_search(search_query, source))
+    
+    # Otherwise try the economic data APIs (BEA, BLS, ACS) first, and only
+    # search the web if they have nothing. (Starting the search alongside
+    # them would spend a Brave request - and a one-second slot of the
+    # shared Brave rate limit - on every question the APIs answer.)
+    # They're only a shortcut, so if they time out we just fall back to web search
+    try:
+        api_data, api_source = await call_with_timeout(
+            lambda: fetch_economic_data(search_query, location=source), SEARCH_TIMEOUT, "Economic data APIs"
+        )
+    except UpstreamTimeout:
+        api_data, api_source = None, None
+    
+    if api_data and api_source:
+        # We got data from an official API, so the web search isn't needed
+        logging.info("Using %s API data instead of web search", api_source)
+        return (api_data, api_source, None)
+    
+    return (None, None, await web_search(search_query, source))
+
+
+def sse_event(payload):
+    """
+    Encode one Server-Sent Event carrying a JSON payload.
+    
+    Args:
+        payload: A JSON-serializable dict (e.g., {"delta": "some text"})
+    
+    Returns:
+        The event text: "data: {...}" followed by a blank line
+    """
+    return f"data: {app.json.dumps(payload)}\n\n"
+
+
+def sse_response(pieces, web):
+    """
+    Stream an AI response to the browser as Server-Sent Events.
+    
+    Each piece of text is sent as soon as it arrives, so the user starts
+    reading while the rest of the answer is still being generated.
+    
+    Args:
+        pieces: Iterator of response text pieces (from cached_completion_stream)
+        web: Whether web search / API data was used (sent with the final event)
+    
+    Returns:
+        A Flask Response with these events:
+            data: {"delta": "next piece of text"}
+            data: {"done": true, "web": true/false}   (last event)
+            data: {"error": "Error message"}          (if the model call fails;
+                                                       the 200 status has already been sent)
+    """
+    def generate():
         try:
-            # Map common county names to FIPS codes
-            # Chatham County, GA (includes Savannah)
-            if 'chatham' in query_lower or 'savannah' in query_lower:
-                variables = []
-                if is_income:
-                    variables.append('B19013_001E')  # Median household income
-                if is_population:
-                    variables.append('B01003_001E')  # Total population
-                
-                if variables:
-                    print(f">>> Attempting ACS API for Chatham County, GA: {variables} (year={requested_year})")
-                    logging.info(f"Attempting ACS API for Chatham County, GA: {variables} (year={requested_year})")
-                    acs_data = census_acs_search('county', '13:051', variables, year=requested_year)
-                    print(f">>> ACS API result: {acs_data}")
-                    if acs_data:
-                        print(f">>> ACS API SUCCESS!")
-                        logging.info(f"ACS API SUCCESS: {acs_data}")
-                        return (acs_data, 'ACS')
-                    else:
-                        print(">>> ACS API returned no data")
-                        logging.warning("ACS API returned no data")
-            
-            # Bryan County, GA
-            elif 'bryan' in query_lower:
-                variables = []
-                if is_income:
-                    variables.append('B19013_001E')
-                if is_population:
-                    variables.append('B01003_001E')
-                
-                if variables:
-                    logging.info(f"Attempting ACS API for Bryan County, GA: {variables} (year={requested_year})")
-                    acs_data = census_acs_search('county', '13:029', variables, year=requested_year)
-                    if acs_data:
-                        return (acs_data, 'ACS')
+            for piece in pieces:
+                yield sse_event({"delta": piece})
+            yield sse_event({"done": True, "web": web})
+        except UpstreamTimeout as e:
+            logging.error("/api/chat/stream upstream timeout: %s", e)
+            yield sse_event({"error": "upstream timeout"})
         except Exception as e:
-            logging.error(f"ACS attempt failed: {e}")
+            logging.exception("/api/chat/stream error")
+            yield sse_event({"error": str(e)})
     
-    # Try BLS for employment data
-    if is_employment and has_location:
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"X-Accel-Buffering": "no"}  # Ask proxies not to hold back the stream
+    )
+
+
+def answer_prompt_batch(model, messages, prompts):
+    """
+    Answer several independent questions with a single GPT call.
+    
+    Each API request has a fixed overhead (and counts against the
+    requests-per-minute limit), so sending N questions together is cheaper
+    and faster than N separate /api/chat requests. The questions go in as a
+    JSON array and the model is asked for a JSON object with one answer each.
+    
+    Args:
+        model: OpenAI model name
+        messages: Conversation to answer in the context of (usually just the
+            system prompt; may be empty)
+        prompts: List of question strings
+    
+    Returns:
+        List of answer strings, one per prompt, in the same order
+    
+    Raises:
+        ValueError: If the model's reply doesn't have one answer per prompt
+    """
+    batch_messages = [
+        *messages,
+        {"role": "system", "content": BATCH_INSTRUCTION},
+        {"role": "user", "content": json_dumps(prompts)}
+    ]
+    
+    def create_batch_completion():
         try:
-            # Chatham County unemployment
-            if 'chatham' in query_lower or 'savannah' in query_lower:
-                series_ids = ['LAUCN130510000000003']  # Chatham County, GA unemployment
-                logging.info(f"Attempting BLS API for Chatham County: {series_ids}")
-                bls_data = bls_api_search(series_ids)
-                if bls_data:
-                    return (bls_data, 'BLS')
-            
-            # Bryan County unemployment
-            elif 'bryan' in query_lower:
-                series_ids = ['LAUCN130290000000003']  # Bryan County, GA unemployment
-                logging.info(f"Attempting BLS API for Bryan County: {series_ids}")
-                bls_data = bls_api_search(series_ids)
-                if bls_data:
-                    return (bls_data, 'BLS')
-        except Exception as e:
-            logging.error(f"BLS attempt failed: {e}")
+            chat = openai_client.chat.completions.create(
+                model=model,
+                messages=batch_messages,
+                temperature=0.5,
+                response_format={"type": "json_object"}  # Always valid JSON
+            )
+        except APITimeoutError as e:
+            raise UpstreamTimeout("OpenAI timed out") from e
+        text = (chat.choices[0].message.content or "").strip()
+        parse_answers(text)  # Raise before a bad reply gets cached
+        return text
     
-    # Try BEA for GDP/economic data
-    if is_gdp and has_location:
+    def parse_answers(text):
         try:
-            logging.info("Attempting BEA API for GDP data")
-            bea_data = bea_api_search('Regional', 'CAGDP1', 'COUNTY')
-            if bea_data:
-                return (bea_data, 'BEA')
-        except Exception as e:
-            logging.error(f"BEA attempt failed: {e}")
+            answers = json_loads(text).get("answers")
+        except (ValueError, AttributeError):
+            answers = None
+        if not (isinstance(answers, list) and len(answers) == len(prompts) and all(isinstance(a, str) for a in answers)):
+            raise ValueError(f"batched reply did not contain {len(prompts)} answers")
+        return [answer.strip() for answer in answers]
     
-    # No API data found
-    logging.info("No economic API data found, will fall back to web search")
-    return (None, None)
+    key = make_cache_key("openai-batch", model, batch_messages)
+    return parse_answers(cached_completion(key, create_batch_completion, model=model))
+
+
+def submit_chat_batch(model, conversations):
+    """
+    Queue conversations with OpenAI's Batch API instead of answering now.
+    
+    Batch requests cost half as much and don't use up the normal rate limits,
+    but can take up to 24 hours, so this is only for work nobody is waiting
+    on (evaluations, backfills). Poll GET /api/batch/<batch_id> for the answers.
+    
+    Args:
+        model: OpenAI model name
+        conversations: List of message lists, one per answer wanted
+    
+    Returns:
+        The OpenAI batch id
+    """
+    # One JSONL line per conversation; custom_id keeps track of the order
+    lines = [
+        json_dumps({
+            "custom_id": f"chat-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": model, "messages": messages, "temperature": 0.5}
+        })
+        for i, messages in enumerate(conversations)
+    ]
+    
+    try:
+        batch_file = openai_client.files.create(
+            file=("chat_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = openai_client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+    except APITimeoutError as e:
+        raise UpstreamTimeout("OpenAI timed out") from e
+    
+    logging.info("Queued OpenAI batch %s (%d requests)", batch.id, len(conversations))
+    return batch.id
+
+
+def fetch_chat_batch(batch_id):
+    """
+    Check on a batch queued by submit_chat_batch().
+    
+    Args:
+        batch_id: The OpenAI batch id
+    
+    Returns:
+        {"status": "in_progress"} (or "validating", "finalizing", "failed", ...)
+        until the batch is done, then {"status": "completed", "texts": [...]}
+        with one answer per conversation, in order (None for any that failed)
+    
+    Raises:
+        NotFoundError: If OpenAI doesn't know this batch id
+    """
+    try:
+        batch = openai_client.batches.retrieve(batch_id)
+        if batch.status != "completed":
+            return {"status": batch.status}
+        
+        # Answers by position; every request shows up in either the output
+        # file or the error file, so together they tell us how many there were
+        answers = {}
+        seen = -1
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in openai_client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json_loads(line)
+                index = int(item["custom_id"].rpartition("-")[2])
+                seen = max(seen, index)
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    answers[index] = (response["body"]["choices"][0]["message"]["content"] or "").strip()
+    except APITimeoutError as e:
+        raise UpstreamTimeout("OpenAI timed out") from e
+    
+    # request_counts can be missing from the batch object
+    total = max((batch.request_counts and batch.request_counts.total) or 0, seen + 1)
+    return {"status": "completed", "texts": [answers.get(i) for i in range(total)]}
 
 
 # ============================================================================
 # ROUTES (URL ENDPOINTS)
 # ============================================================================
 
+def ui_etag():
+    """
+    Build an ETag for the chat page.
+    
+    The ETag changes whenever the template or any static file (CSS/JS) is
+    modified, so browsers only re-download the page after a change.
+    
+    Returns:
+        Short hex string identifying the current version of the UI files
+    """
+    paths = [Path(app.template_folder) / "index.html", *Path(app.static_folder).rglob("*")]
+    latest = max(path.stat().st_mtime_ns for path in paths if path.is_file())
+    return hashlib.blake2b(str(latest).encode("utf-8"), digest_size=8).hexdigest()
+
+
+# HTML comments, and the indentation/blank lines around each line break
+_HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_HTML_LINE_SPACE_RE = re.compile(r"\s*\n\s*")
+
+
+def minify_html(html):
+    """
+    Make the rendered chat page smaller without changing how it looks.
+    
+    templates/index.html is heavily commented and indented so it's easy to
+    read and learn from; browsers don't need any of that. Comments are
+    dropped and each run of whitespace that spans a line break becomes a
+    single newline (browsers treat any run of whitespace the same, and the
+    page has no <pre> or <textarea> where it would matter).
+    
+    Args:
+        html: The rendered page
+    
+    Returns:
+        The same page with less whitespace
+    """
+    html = _HTML_COMMENT_RE.sub("", html)
+    return _HTML_LINE_SPACE_RE.sub("\n", html).strip()
+
+
+# The chat page for the current UI version, rendered once: the ETag it was
+# built for, and the HTML bytes by encoding ("identity", "gzip", "br")
+_index_page = (None, {})
+
+
+def get_index_page():
+    """
+    Return the ETag and the rendered chat page, rendering and compressing it
+    only when the UI files have changed.
+    
+    In production the UI files only change with a deploy, so the ETag is
+    worked out once; with FLASK_DEBUG=1 it's checked on every request so
+    edits show up right away.
+    
+    Returns:
+        Tuple of (etag, {encoding: body bytes})
+    """
+    global _index_page
+    etag, bodies = _index_page
+    if etag is not None and not app.debug:
+        return etag, bodies
+    
+    current = ui_etag()
+    if current != etag:
+        html = minify_html(render_template("index.html", v=current)).encode("utf-8")
+        bodies = {"identity": html, "gzip": gzip.compress(html, compresslevel=9)}
+        if BROTLI_AVAILABLE:
+            bodies["br"] = brotli.compress(html)
+        _index_page = (current, bodies)
+    return current, bodies
+
+
 @app.get("/")
 def index():
     """
@@ -570,16 +2552,40 @@ def index():
     When a user visits http://localhost:8080/ in their browser,
     this function runs and returns the HTML page (templates/index.html).
     
+    If the browser already has the current version (its If-None-Match header
+    matches our ETag), we return an empty 304 response. Otherwise we send the
+    page rendered (and brotli/gzip-compressed) ahead of time by get_index_page.
+    
+    The same ETag is used as the ?v= version on the CSS/JS links, so their
+    URLs only change when the files change and browsers can cache them.
+    
     Returns:
-        The rendered HTML page with the chat interface
+        The rendered HTML page with the chat interface (or 304 Not Modified)
     """
-    import time
-    # Add a version parameter for cache busting
-    version = str(int(time.time()))
-    return render_template("index.html", v=version)
+    etag, bodies = get_index_page()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    # Use the best compressed copy the browser accepts
+    encoding = next(
+        (name for name in ("br", "gzip") if name in bodies and request.accept_encodings[name]),
+        "identity"
+    )
+    response = app.response_class(bodies[encoding], mimetype="text/html")
+    response.vary.add("Accept-Encoding")
+    if encoding == "identity":
+        response.set_etag(etag)
+    else:
+        response.headers["Content-Encoding"] = encoding
+        # Same ":br"/":gzip" ETag marks as Flask-Compress (see strip_compressed_etag)
+        response.set_etag(f"{etag}:{encoding}")
+    return response
 
 
 @app.post("/api/chat")
+@app.post("/api/chat/stream")
 def api_chat():
     """
     Chat API endpoint - handles conversation with the AI.
@@ -600,33 +2606,109 @@ def api_chat():
             ]
         }
     
+    Or, to answer several separate questions with one GPT call (no web
+    search or streaming; messages is optional and gives shared context):
+        {
+            "messages": [{"role": "system", "content": "You are a helpful assistant"}],
+            "prompts": ["What is the capital of France?", "What is the capital of Spain?"]
+        }
+    
     Query parameters:
         web=1 : Enable web search for live information
         model=<model_name> : Specify which AI model to use (optional)
     
+    Adding "priority": "batch" (GPT only) queues the messages, or each of
+    the prompts, with OpenAI's Batch API at half price instead of answering
+    now (see submit_chat_batch); the answers come from GET /api/batch/<id>.
+    
     Returns (JSON):
         Success: {"text": "The AI's response text", "web": true/false}
+                 {"texts": ["First answer", "Second answer"]}   (for "prompts")
+                 {"batch_id": "batch_abc123"}   (202, for "priority": "batch")
         Error:   {"error": "Error message"}
+    
+    Posting to /api/chat/stream instead returns the response as Server-Sent
+    Events while it's being generated (see sse_response). Errors that happen
+    before the model starts answering still come back as JSON.
     """
+    # Start the per-request log record (see log_chat_request)
+    g.chat_start = time.perf_counter()
+    g.chat = {"path": request.path}
+    
     try:
         # ====================================================================
         # 1. VALIDATE REQUEST
         # ====================================================================
         
+        # Reject huge bodies up front, before spending time parsing them
+        if request.content_length is not None and request.content_length > MAX_REQUEST_BYTES:
+            return jsonify({"error": "request too large"}), 413
+        
         # Get the JSON data from the request body
         # silent=True means don't crash if the JSON is invalid, just return None
+        # (Flask keeps the parsed result, so calling get_json() again is free)
         data = request.get_json(silent=True) or {}
         
+        # A valid JSON body that isn't an object (e.g. [1, 2]) has no fields to read
+        if not isinstance(data, dict):
+            return jsonify({"error": "request body must be a JSON object"}), 400
+        
         # Extract the messages array from the request
         messages = data.get("messages")
         
-        # Validate that messages is a list and not empty
-        if not isinstance(messages, list) or not messages:
-            return jsonify({"error": "messages[] required"}), 400
-        
         # Get the model from query parameter, or use the default
         # This allows the user to select which model to use via the dropdown
         model = request.args.get("model", MODEL)
+        model_info = MODEL_INFO.get(model, DEFAULT_MODEL_INFO)
+        
+        # A "prompts" list is a batch of separate questions, answered together
+        prompts = data.get("prompts")
+        if prompts is not None:
+            if not (isinstance(prompts, list) and prompts and all(isinstance(p, str) and p.strip() for p in prompts)):
+                return jsonify({"error": "prompts[] must be a list of questions"}), 400
+            if len(prompts) > MAX_BATCH_PROMPTS:
+                return jsonify({"error": f"at most {MAX_BATCH_PROMPTS} prompts per request"}), 400
+        
+        # Check every message's role and content up front
+        # (messages is optional when there are prompts)
+        if isinstance(messages, list) and len(messages) > MAX_MESSAGES:
+            return jsonify({"error": f"too many messages (max {MAX_MESSAGES})"}), 413
+        if prompts is None or messages:
+            error = validate_messages(messages)
+            if error:
+                return jsonify({"error": error}), 400
+        messages = messages or []
+        
+        # "priority": "batch" hands the work to OpenAI's Batch API, for
+        # requests that can wait hours for an answer in exchange for half the cost
+        if data.get("priority") == "batch":
+            if model_info.provider != "openai":
+                return jsonify({"error": "priority=batch is only available for GPT models"}), 400
+            if not OPENAI_API_KEY:
+                return jsonify({"error": "OPENAI_API_KEY not set"}), 500
+            if prompts is not None:
+                conversations = [[*messages, {"role": "user", "content": prompt}] for prompt in prompts]
+            else:
+                conversations = [messages]
+            
+            g.chat.update(model=model, provider="openai", batch=len(conversations))
+            batch_id = submit_chat_batch(model, conversations)
+            return jsonify({"batch_id": batch_id}), 202
+        
+        if prompts is not None:
+            if not model_info.json_mode:
+                return jsonify({"error": "prompts[] batching is only available for GPT models"}), 400
+            if not OPENAI_API_KEY:
+                return jsonify({"error": "OPENAI_API_KEY not set"}), 500
+            
+            g.chat.update(model=model, provider="openai", batch=len(prompts))
+            try:
+                texts = answer_prompt_batch(model, messages, prompts)
+            except ValueError as e:
+                logging.error("/api/chat batch error: %s", e)
+                g.chat["error"] = "batch_mismatch"
+                return jsonify({"error": str(e)}), 502
+            return jsonify({"texts": texts})
         
         # Get the data source filter (for site-specific searches)
         source = request.args.get("source", "")
@@ -634,21 +2716,82 @@ def api_chat():
         # Check if web search is enabled via the ?web=1 query parameter
         use_web = request.args.get("web") == "1"
         
-        logging.info(f"===== /api/chat request: model={model}, source={source}, use_web={use_web} =====")
-        logging.info(f"Last user message: {messages[-1] if messages else 'None'}")
+        # Stream the response as it's generated (POST /api/chat/stream)?
+        stream = request.path == "/api/chat/stream"
+        
+        # How long the answer may be (shorter limits come back faster)
+        # (only a missing max_tokens gets the default; 0 is rejected below)
+        requested_tokens = data.get("max_tokens")
+        if requested_tokens is None:
+            requested_tokens = MAX_OUTPUT_TOKENS
+        try:
+            max_tokens = min(int(requested_tokens), MAX_OUTPUT_TOKENS_LIMIT, model_info.max_output_tokens)
+        except (TypeError, ValueError):
+            max_tokens = 0
+        if max_tokens < 1:
+            return jsonify({"error": "max_tokens must be a positive number"}), 400
+        
+        logging.info("===== /api/chat request: model=%s, source=%s, use_web=%s =====", model, source, use_web)
+        g.chat.update(model=model, source=source, web=use_web, stream=stream)
+        logging.debug("Last user message: %s", messages[-1])
+        
+        # Empty, oversized and small-talk messages are answered right here
+        direct = direct_reply(messages)
+        if direct is not None:
+            reason, status, result = direct
+            logging.info("Answered directly (%s)", reason)
+            g.chat["direct_reply"] = reason
+            if stream and status == 200:
+                return sse_response(iter([result["text"]]), web=False)
+            return jsonify(result), status
+        
+        # If this conversation (or the same one with a reworded last question)
+        # was answered a few minutes ago, send the same answer again without
+        # searching or calling the AI model
+        # (the key is built before the messages are modified below)
+        response_key = make_response_key(model, source, use_web, messages, max_tokens)
+        cached, hit_type = find_cached_response(response_key)
+        g.chat["response_cache_hit"] = hit_type  # "exact", "semantic" or None (a miss)
+        if cached is not None:
+            logging.info("Response cache hit (%s): %s", hit_type, response_key.exact)
+            if stream:
+                return sse_response(iter([cached["text"]]), web=cached["web"])
+            return jsonify(cached)
+        
+        # Only send as much of a long conversation as fits the token budget
+        # (repeats dropped, older turns summarized)
+        messages = compact_history(messages)
         
         # ====================================================================
         # 2. CLAUDE (ANTHROPIC) MODELS
         # ====================================================================
         
-        if model in CLAUDE_MODELS:
+        if model_info.provider == "anthropic":
+            g.chat["provider"] = "anthropic"
+            
             # Check if Anthropic client is available
+            anthropic_client = get_anthropic_client()
             if not anthropic_client:
                 return jsonify({"error": "Claude models not available. Install anthropic package and set ANTHROPIC_API_KEY"}), 500
             
             # Separate system messages from conversation
-            system_content = ""
+            # system_parts holds the instructions that are the same on every
+            # turn; context_parts holds this turn's API data / search results.
+            # Each list is joined into one string once, at the end.
+            system_parts = []
+            context_parts = []
             claude_messages = []
+            search_results = None
+            
+            # If web search is enabled, start looking up API data / search
+            # results now, and build the rest of the prompt while they load
+            lookup = None
+            if use_web:
+                last_user_msg = find_last_user_message(messages)
+                if last_user_msg:
+                    # Clean up the query (drop the frontend's [INSTRUCTIONS: ...], substitute pronouns)
+                    search_query = clean_search_query(last_user_msg.get("content", ""), source)
+                    lookup = start_async(gather_context(search_query, source))
             
             for msg in messages:
                 if not isinstance(msg, dict):
@@ -657,258 +2800,270 @@ def api_chat():
                 content = msg.get("content", "")
                 
                 if role == "system":
-                    system_content += content + "\n\n"
+                    system_parts.append(content + "\n\n")
                 elif role in ("user", "assistant"):
                     claude_messages.append({"role": role, "content": content})
             
-            # If web search is enabled, perform search and add results
-            if use_web and claude_messages:
-                # Get the last user message for search query
-                last_user_msg = next((m for m in reversed(claude_messages) if m["role"] == "user"), None)
-                
-                if last_user_msg:
-                    # Extract clean query (remove any [INSTRUCTIONS: ...] added by frontend)
-                    raw_query = last_user_msg["content"]
-                    search_query = raw_query.split('[INSTRUCTIONS:')[0].strip()
-                    
-                    # Substitute pronouns based on data source
-                    search_query = substitute_pronouns(search_query, source)
-                    
-                    # Try economic data APIs first (BEA, BLS, ACS)
-                    api_data, api_source = fetch_economic_data(search_query, location=source)
-                    
-                    if api_data and api_source:
-                        # We got data from an official API!
-                        print(f">>> [Claude] Using {api_source} API data instead of web search")
-                        logging.info(f"Using {api_source} API data instead of web search")
-                        formatted_api_data = f"\n\nData from {api_source} API:\n{json.dumps(api_data, indent=2)}\n\n"
-                        api_instruction = (
-                            formatted_api_data +
-                            f"Use this official {api_source} data to answer the user's question. "
-                            "The B19013_001E field contains the median household income value (5-year estimate). "
-                            "When presenting numerical data, format them in **bold** using markdown for clarity. "
-                            "Present your answer in a single paragraph without extra line breaks between sentences. "
-                            "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
-                            "After the factual answer, add an 'Insights' section with 2–4 concise bullet points."
-                        )
-                        print(f">>> [Claude] Formatted API instruction: {api_instruction[:200]}...")
-                        system_content += api_instruction
-                        search_results = None  # Skip web search
-                    else:
-                        # Fall back to web search with DataUSA and FRED priority
-                        # Add site: filter based on source parameter
-                        search_query = apply_site_filter(search_query, source)
-                        
-                        # If no specific source, prioritize DataUSA and FRED for economic queries
-                        if source == 'all' and any(word in search_query.lower() for word in ['income', 'wage', 'employment', 'unemployment', 'gdp', 'economy']):
-                            # Search DataUSA first
-                            logging.info(f"Trying DataUSA for economic data: site:datausa.io {search_query}")
-                            search_results = brave_search(f"site:datausa.io {search_query}", count=5)
-                            
-                            # If DataUSA doesn't have good results, try FRED
-                            if not search_results or len(search_results) < 2:
-                                logging.info(f"Trying FRED for economic data: site:fred.stlouisfed.org {search_query}")
-                                fred_results = brave_search(f"site:fred.stlouisfed.org {search_query}", count=5)
-                                if fred_results:
-                                    search_results = fred_results
-                        else:
-                            logging.info(f"Performing Brave Search for Claude: {search_query}")
-                            search_results = brave_search(search_query, count=10)
-                    
-                    if search_results:
-                        # Add search results to system prompt
-                        formatted_results = format_search_results(search_results)
-                        system_content += (
-                            f"\n\n{formatted_results}\n\n"
-                            "Use these search results to answer the user's question. Cite sources with URLs when possible. "
-                            "When presenting numerical data (statistics, dollar amounts, percentages, years, etc.), format them in **bold** using markdown for clarity. "
-                            "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
-                            "CRITICAL: Only use numerical values that are EXPLICITLY stated in the search results. Do NOT estimate, interpolate, or make up numbers. "
-                            "If the user asks for a single data point (e.g., 'What is the median income in 2022?') and you find it in the search results, provide it. "
-                            "If the user asks for time-series data (e.g., income from 2015-2023) and year-by-year values are NOT in the search results, provide the link and say: 'We are currently unable to display the year-by-year data directly, but you can view the complete dataset at [link]. We are working on integrating directly with the U.S. Census Bureau to provide this data in future updates.' "
-                            "After the factual answer, add an 'Insights' section with 2–4 concise bullet points that synthesize patterns, comparisons, trends, or implications grounded in the cited sources. "
-                            "Do not invent facts; if the evidence is insufficient, state that explicitly."
-                        )
             # Always encourage a concise Insights section even without search
-            system_content += (
-                "\n\nWhen you present the answer, keep it concise and clear. "
-                "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
-                "Then add an 'Insights' section with 2–4 bullets that provide thoughtful analysis grounded in the referenced sources. "
-                "Avoid speculation beyond the evidence."
-            )
+            system_parts.append(CLAUDE_INSIGHTS_INSTRUCTION)
+            system_content = "".join(system_parts).strip()
             
             # Log system content for debugging chartjson
-            if "time range" in last_user_message.lower() or ("from" in last_user_message.lower() and "to" in last_user_message.lower()):
-                logging.info(f"[Claude] Time range query detected. System prompt includes chartjson: {'chartjson' in system_content}")
+            last_user_text = (find_last_user_message(claude_messages) or {}).get("content", "").lower()
+            is_time_range = "time range" in last_user_text or ("from" in last_user_text and "to" in last_user_text)
+            if is_time_range:
+                logging.info("[Claude] Time range query detected. System prompt includes chartjson: %s", 'chartjson' in system_content)
             
-            # Call Claude API
-            response = anthropic_client.messages.create(
-                model=model,
-                max_tokens=4096,
-                temperature=0.5,  # Balanced consistency and naturalness
-                system=system_content.strip() if system_content else None,
-                messages=claude_messages
-            )
+            # Now wait for the official API data or web search results
+            if lookup is not None:
+                api_data, api_source, search_results = lookup.result()
+                g.chat.update(api_source=api_source, web_results=len(search_results or []))
+                
+                if api_data and api_source:
+                    api_instruction = API_DATA_INSTRUCTION.format(
+                        source=api_source, data=json_dumps_pretty(api_data)
+                    )
+                    logging.debug("[Claude] Formatted API instruction: %s...", api_instruction[:200])
+                    context_parts.append(api_instruction)
+
+                if search_results:
+                    # Add search results to system prompt
+                    context_parts.append(SEARCH_RESULTS_INSTRUCTION.format(
+                        results=format_search_results(search_results)
+                    ))
+            context_content = "".join(context_parts).strip()
+            
+            # Send the system prompt as two blocks: the unchanging instructions
+            # first (marked for Anthropic prompt caching, so repeat turns don't
+            # re-bill them), then this turn's API data / search results
+            system_blocks = [
+                {"type": "text", "text": system_content, "cache_control": {"type": "ephemeral"}}
+            ]
+            if context_content:
+                system_blocks.append({"type": "text", "text": context_content})
+            
+            def create_claude_completion():
+                from anthropic import APITimeoutError as AnthropicTimeoutError
+                
+                # Call Claude API (prompt caching is a beta endpoint in this SDK version)
+                try:
+                    response = anthropic_client.beta.prompt_caching.messages.create(
+                        model=model,
+                        max_tokens=max_tokens,
+                        temperature=0.5,  # Balanced consistency and naturalness
+                        system=system_blocks,
+                        messages=claude_messages
+                    )
+                except AnthropicTimeoutError as e:
+                    raise UpstreamTimeout("Claude timed out") from e
+                
+                # Extract text from response (joined once, like the system prompt)
+                return "".join(block.text for block in response.content if hasattr(block, 'text'))
+            
+            def stream_claude_completion():
+                from anthropic import APITimeoutError as AnthropicTimeoutError
+                
+                # Same call as above, but the text arrives in pieces as it's generated
+                try:
+                    with anthropic_client.beta.prompt_caching.messages.stream(
+                        model=model,
+                        max_tokens=max_tokens,
+                        temperature=0.5,
+                        system=system_blocks,
+                        messages=claude_messages
+                    ) as claude_stream:
+                        yield from claude_stream.text_stream
+                except AnthropicTimeoutError as e:
+                    raise UpstreamTimeout("Claude timed out") from e
             
-            # Extract text from response
-            text = ""
-            for block in response.content:
-                if hasattr(block, 'text'):
-                    text += block.text
+            # Reuse the cached response if this exact prompt was answered recently
+            cache_key = make_cache_key("anthropic", model, max_tokens, system_blocks, claude_messages)
+            web_used = use_web and bool(search_results)
+            if stream:
+                return sse_response(
+                    remember_streamed_response(
+                        response_key,
+                        cached_completion_stream(cache_key, stream_claude_completion, model=model),
+                        web_used
+                    ),
+                    web=web_used
+                )
+            text = cached_completion(cache_key, create_claude_completion, model=model)
             
             # Log if chartjson was generated
             if "chartjson" in text:
-                logging.info(f"[Claude] Response contains chartjson: {text[:200]}")
-            elif "time range" in last_user_message.lower() or ("from" in last_user_message.lower() and "to" in last_user_message.lower()):
-                logging.warning(f"[Claude] Time range query but no chartjson in response")
+                logging.info("[Claude] Response contains chartjson: %s", text[:200])
+            elif is_time_range:
+                logging.warning("[Claude] Time range query but no chartjson in response")
             
             text = text.strip()
             
-            return jsonify({"text": text, "web": use_web and bool(search_results) if use_web else False})
+            result = {"text": text, "web": web_used}
+            remember_response(response_key, result)
+            return jsonify(result)
         
         # ====================================================================
         # 3. OPENAI (GPT) MODELS WITH BRAVE SEARCH
         # ====================================================================
         
+        g.chat["provider"] = "openai"
+        
         # Make sure the API key is set
-        if not os.getenv("OPENAI_API_KEY"):
+        if not OPENAI_API_KEY:
             return jsonify({"error": "OPENAI_API_KEY not set"}), 500
         
         # If web search is enabled, use Brave Search API
         search_results = []
         if use_web:
             # Get the last user message for search query
-            last_user_msg = next((m for m in reversed(messages) if isinstance(m, dict) and m.get("role") == "user"), None)
+            last_user_msg = find_last_user_message(messages)
             
             if last_user_msg:
-                # Extract clean query (remove any [INSTRUCTIONS: ...] added by frontend)
-                raw_query = last_user_msg.get("content", "")
-                search_query = raw_query.split('[INSTRUCTIONS:')[0].strip()
+                # Clean up the query (drop the frontend's [INSTRUCTIONS: ...], substitute pronouns)
+                search_query = clean_search_query(last_user_msg.get("content", ""), source)
                 
-                # Substitute pronouns based on data source
-                search_query = substitute_pronouns(search_query, source)
-                
-                # Try economic data APIs first (BEA, BLS, ACS)
-                api_data, api_source = fetch_economic_data(search_query, location=source)
+                # Look up official API data or web search results, finding
+                # where the results will go in the meantime
+                lookup = start_async(gather_context(search_query, source))
+                insert_at = next(i for i, m in enumerate(messages) if m is last_user_msg)
+                api_data, api_source, search_results = lookup.result()
+                g.chat.update(api_source=api_source, web_results=len(search_results or []))
                 
                 search_instruction = None  # Will be set by either API or web search
                 
                 if api_data and api_source:
-                    # We got data from an official API!
-                    print(f">>> Using {api_source} API data instead of web search")
-                    logging.info(f"Using {api_source} API data instead of web search")
-                    
-                    # Extract year from API data if available (ACS includes it in the response)
-                    year_info = api_data.get('year', 'latest')
-                    
-                    formatted_api_data = f"\n\nData from {api_source} API:\n{json.dumps(api_data, indent=2)}\n\n"
-                    search_instruction = (
-                        formatted_api_data +
-                        f"Use this official {api_source} data to answer the user's question. "
-                        "The B19013_001E field contains the median household income value (5-year estimate). "
-                        "When presenting numerical data, format them in **bold** using markdown for clarity. "
-                        "Present your answer in a single paragraph without extra line breaks between sentences. "
-                        "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
-                        "After the factual answer, add an 'Insights' section with 2–4 concise bullet points."
+                    search_instruction = API_DATA_INSTRUCTION.format(
+                        source=api_source, data=json_dumps_pretty(api_data)
                     )
-                    print(f">>> Formatted API instruction: {search_instruction[:200]}...")
+                    logging.debug("Formatted API instruction: %s...", search_instruction[:200])
                 else:
-                    # Fall back to web search with DataUSA and FRED priority
-                    # Add site: filter based on source parameter
-                    search_query = apply_site_filter(search_query, source)
-                    
-                    # If no specific source, prioritize DataUSA and FRED for economic queries
-                    if source == 'all' and any(word in search_query.lower() for word in ['income', 'wage', 'employment', 'unemployment', 'gdp', 'economy']):
-                        # Search DataUSA first
-                        logging.info(f"Trying DataUSA for economic data: site:datausa.io {search_query}")
-                        search_results = brave_search(f"site:datausa.io {search_query}", count=5)
-                        
-                        # If DataUSA doesn't have good results, try FRED
-                        if not search_results or len(search_results) < 2:
-                            logging.info(f"Trying FRED for economic data: site:fred.stlouisfed.org {search_query}")
-                            fred_results = brave_search(f"site:fred.stlouisfed.org {search_query}", count=5)
-                            if fred_results:
-                                search_results = fred_results
-                    else:
-                        logging.info(f"Performing Brave Search for GPT: {search_query}")
-                        search_results = brave_search(search_query, count=10)
-                    
                     # Format web search results into instruction
                     if search_results:
-                        formatted_results = format_search_results(search_results)
-                        search_instruction = (
-                            f"\n\n{formatted_results}\n\n"
-                            "Use these search results to answer the user's question. Cite sources with URLs when possible. "
-                            "When presenting numerical data (statistics, dollar amounts, percentages, years, etc.), format them in **bold** using markdown for clarity. "
-                            "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
-                            "CRITICAL: Only use numerical values that are EXPLICITLY stated in the search results. Do NOT estimate, interpolate, or make up numbers. "
-                            "If the user asks for a single data point (e.g., 'What is the median income in 2022?') and you find it in the search results, provide it. "
-                            "If the user asks for time-series data (e.g., income from 2015-2023) and year-by-year values are NOT in the search results, provide the link and say: 'We are currently unable to display the year-by-year data directly, but you can view the complete dataset at [link]. We are working on integrating directly with the U.S. Census Bureau to provide this data in future updates.' "
-                            "After the factual answer, add an 'Insights' section with 2–4 concise bullet points that synthesize patterns, comparisons, trends, or implications grounded in the cited sources. "
-                            "Do not invent facts; if the evidence is insufficient, state that explicitly."
+                        search_instruction = SEARCH_RESULTS_INSTRUCTION.format(
+                            results=format_search_results(search_results)
                         )
                 
                 # Now add the instruction (from either API or web search) to messages
                 if search_instruction:
-                    print(f">>> Adding instruction to messages (API={bool(api_data)}, Web={bool(not api_data)})")
-                    # Find system message or create one
-                    system_msg_found = False
-                    for msg in messages:
-                        if isinstance(msg, dict) and msg.get("role") == "system":
-                            print(f">>> Appending to existing system message")
-                            msg["content"] += search_instruction
-                            system_msg_found = True
-                            break
-                    
-                    # If no system message exists, add one at the beginning
-                    if not system_msg_found:
-                        print(f">>> Creating new system message with instruction")
-                        messages.insert(0, {"role": "system", "content": search_instruction.strip()})
+                    logging.debug("Adding instruction to messages (API=%s, Web=%s)", bool(api_data), bool(not api_data))
+                    # Insert it as its own system message right before the latest
+                    # user message. Everything before that point (the system prompt
+                    # and earlier turns) then stays exactly the same from turn to
+                    # turn, which lets OpenAI's automatic prompt caching reuse it.
+                    messages.insert(insert_at, {"role": "system", "content": search_instruction.strip()})
                 else:
                     # Ensure insights guidance is present even without search results
-                    insights_only_instruction = (
-                        "After the factual answer, add an 'Insights' section with 2–4 concise bullet points that "
-                        "synthesize patterns, comparisons, trends, or implications grounded in the provided sources or prior context. "
-                        "Use bullets that start with the Unicode bullet symbol (•) instead of dashes or numbers. "
-                        "Do not invent facts; if evidence is insufficient, say so."
-                    )
                     system_msg_found = False
                     for msg in messages:
                         if isinstance(msg, dict) and msg.get("role") == "system":
-                            msg["content"] = (msg.get("content", "") + "\n\n" + insights_only_instruction).strip()
+                            msg["content"] = "\n\n".join(filter(None, [msg.get("content", "").strip(), INSIGHTS_ONLY_INSTRUCTION]))
                             system_msg_found = True
                             break
                     if not system_msg_found:
-                        messages.insert(0, {"role": "system", "content": insights_only_instruction})
+                        messages.insert(0, {"role": "system", "content": INSIGHTS_ONLY_INSTRUCTION})
         
         # ====================================================================
         # 4. STANDARD OPENAI CHAT MODE (WITH OR WITHOUT SEARCH RESULTS)
         # ====================================================================
         
-        # Use the standard Chat Completions API
-        # If search results were found, they're now in the messages
-        chat = openai_client.chat.completions.create(
-            model=model,        # Which AI model to use (from dropdown)
-            messages=messages,  # The conversation history (with search results if available)
-            temperature=0.5     # Balanced consistency and naturalness
-        )
+        def create_openai_completion():
+            # Use the standard Chat Completions API
+            # If search results were found, they're now in the messages
+            try:
+                chat = openai_client.chat.completions.create(
+                    model=model,        # Which AI model to use (from dropdown)
+                    messages=messages,  # The conversation history (with search results if available)
+                    temperature=0.5,    # Balanced consistency and naturalness
+                    max_tokens=max_tokens  # Longest answer allowed
+                )
+            except APITimeoutError as e:
+                raise UpstreamTimeout("OpenAI timed out") from e
+            
+            # Extract the AI's response text from the API response
+            # choices[0] gets the first (and usually only) response
+            # message.content is the actual text
+            return (chat.choices[0].message.content or "").strip()
         
-        # Extract the AI's response text from the API response
-        # choices[0] gets the first (and usually only) response
-        # message.content is the actual text
-        text = (chat.choices[0].message.content or "").strip()
+        def stream_openai_completion():
+            # Same call as above, but the text arrives in pieces as it's generated
+            try:
+                chunks = openai_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.5,
+                    max_tokens=max_tokens,
+                    stream=True
+                )
+                for chunk in chunks:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except APITimeoutError as e:
+                raise UpstreamTimeout("OpenAI timed out") from e
+        
+        # Reuse the cached response if this exact prompt was answered recently
+        cache_key = make_cache_key("openai", model, max_tokens, messages)
+        web_used = use_web and bool(search_results)
+        if stream:
+            return sse_response(
+                remember_streamed_response(
+                    response_key,
+                    cached_completion_stream(cache_key, stream_openai_completion, model=model),
+                    web_used
+                ),
+                web=web_used
+            )
+        text = cached_completion(cache_key, create_openai_completion, model=model)
         
-        # Return the response as JSON
-        return jsonify({"text": text, "web": use_web and bool(search_results)})
+        # Return the response as JSON (and remember it for repeats)
+        result = {"text": text, "web": web_used}
+        remember_response(response_key, result)
+        return jsonify(result)
+    
+    except UpstreamTimeout as e:
+        # An upstream API was too slow even after a retry
+        logging.error("/api/chat upstream timeout: %s", e)
+        g.chat["error"] = "upstream_timeout"
+        return jsonify({"error": "upstream timeout"}), 504
         
     except Exception as e:
         # If anything goes wrong, log the full error with stack trace
         logging.exception("/api/chat error")
+        g.chat["error"] = type(e).__name__
+        if SENTRY_AVAILABLE:
+            sentry_sdk.capture_exception(e)  # Does nothing unless Sentry was initialized
         
         # Return an error response to the client
         return jsonify({"error": str(e)}), 500
 
 
+@app.get("/api/batch/<batch_id>")
+def api_batch(batch_id):
+    """
+    Check on a chat request queued with "priority": "batch".
+    
+    The frontend (or script) that queued the batch polls this until the
+    status is "completed".
+    
+    Returns (JSON):
+        Waiting: {"status": "in_progress"}   (or "validating", "finalizing", ...)
+        Done:    {"status": "completed", "texts": ["First answer", ...]}
+        Error:   {"error": "Error message"}
+    """
+    if not OPENAI_API_KEY:
+        return jsonify({"error": "OPENAI_API_KEY not set"}), 500
+    
+    try:
+        return jsonify(fetch_chat_batch(batch_id))
+    except NotFoundError:
+        return jsonify({"error": "batch not found"}), 404
+    except UpstreamTimeout as e:
+        logging.error("/api/batch upstream timeout: %s", e)
+        return jsonify({"error": "upstream timeout"}), 504
+    except Exception as e:
+        logging.exception("/api/batch error")
+        return jsonify({"error": str(e)}), 500
+
+
 # ============================================================================
 # SERVER STARTUP
 # ============================================================================
@@ -924,16 +3079,23 @@ if __name__ == "__main__":
     
     # Get the port number from the PORT environment variable
     # If PORT is not set, default to 5000
-    port = int(os.getenv("PORT", "5000"))
+    port = int(_env.get("PORT", "5000"))
     
     # Check if debug mode is enabled via FLASK_DEBUG=1
     # Debug mode enables:
     # - Auto-reload when code changes
     # - Better error messages
     # - Interactive debugger
-    debug = os.getenv("FLASK_DEBUG", "0") == "1"
+    debug = _env.get("FLASK_DEBUG", "0") == "1"
     
     # Start the Flask development server
     # host="0.0.0.0" means accept connections from any IP address
     # (not just localhost, so you can access from other devices on your network)
-    app.run(host="0.0.0.0", port=port, debug=debug)
\ No newline at end of file
+    # threaded=True serves each request in its own thread, so a long or
+    # streaming response doesn't hold up other requests.
+    # In production, gunicorn runs the app instead (see Procfile).
+    start_warmup()
+    if not debug:
+        logging.warning("Running Flask's development server; for production use "
+                        "\"gunicorn app:app\" (worker settings are in gunicorn.conf.py)")
+    app.run(host="0.0.0.0", port=port, debug=debug, threaded=True)
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Gunicorn settings for production (Render runs "gunicorn app:app", and
+gunicorn reads this file from the working directory automatically).
+
+Each chat request spends almost all of its time waiting on other services
+(Brave, the economic data APIs, OpenAI/Anthropic), not using the CPU.
+Threaded workers let one process wait on many of those requests at once,
+instead of tying up a whole process per chat.
+
+Why not gevent or an async (ASGI) worker? The upstream calls already run
+concurrently on one asyncio event loop per process (see run_async in
+app.py); a view thread only waits for the result. gevent's monkey-patching
+doesn't mix with that loop and its thread, and an async worker would need
+the app rewritten for an async framework. A waiting thread costs little
+memory, so raising WEB_THREADS is the way to serve more chats at once.
+
+Environment variables:
+- WEB_CONCURRENCY (optional): number of worker processes (default 2)
+- WEB_THREADS (optional): threads per worker process (default 32)
+- WEB_KEEPALIVE (optional): seconds to keep an idle connection open (default 75)
+- PORT (optional): port to listen on (default 5000; Render sets it)
+"""
+
+import os
+
+# Listen on all interfaces, on the port the platform tells us to use
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# gthread workers: each process serves requests from a pool of threads
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+
+# Threads are cheap while they wait on network I/O, so use plenty of them
+threads = int(os.environ.get("WEB_THREADS", "32"))
+
+# Keep idle client connections open between chat turns, so the browser (or
+# Render's load balancer in front of us) doesn't reconnect for every message.
+# This should be longer than the load balancer's own idle timeout.
+keepalive = int(os.environ.get("WEB_KEEPALIVE", "75"))
+
+# On a restart or deploy, give in-flight answers (which can take a minute
+# or two, including one retry) time to finish before workers are stopped
+graceful_timeout = 120
+
+
+def post_worker_init(worker):
+    """
+    Runs in each worker process once it has forked and loaded app.py.
+    
+    Starts the background warm-ups (tiktoken, connections to the AI
+    providers) here rather than when app.py is imported, so each worker
+    opens its own connections instead of inheriting unusable ones.
+    """
+    import app
+    app.start_warmup()
@@ -87,6 +87,12 @@ const messages = [
   { role: 'system', content: systemMessage }
 ];
 
+// The last question that got a complete answer, and that answer
+// (sending the exact same question again right away, with the same model
+// and data source, reuses the answer instead of asking the server again -
+// see send()). key is "model|source|question".
+let lastExchange = null;
+
 
 // ============================================================================
 // HELPER FUNCTIONS
@@ -182,6 +188,20 @@ function render() {
 }
 
 
+// Re-render at most once per animation frame
+// (a streamed answer arrives in many small pieces, often several per frame)
+let renderPending = false;
+
+function scheduleRender() {
+  if (renderPending) return;
+  renderPending = true;
+  requestAnimationFrame(() => {
+    renderPending = false;
+    render();
+  });
+}
+
+
 // ============================================================================
 // MARKDOWN RENDERER - Convert markdown text to HTML
 // ============================================================================
@@ -259,6 +279,48 @@ function renderMarkdown(text) {
   return html;
 }
 
+// ============================================================================
+// STREAM READER - Read Server-Sent Events from a fetch() response
+// ============================================================================
+
+async function readEventStream(res, onEvent) {
+  /**
+   * Reads a text/event-stream response and calls onEvent for each event.
+   * 
+   * We can't use EventSource here because it only supports GET requests,
+   * and the conversation has to be POSTed. Each event looks like:
+   *   data: {"delta": "next piece of text"}
+   * followed by a blank line.
+   * 
+   * @param {Response} res - The fetch() response
+   * @param {Function} onEvent - Called with each event's parsed JSON data
+   */
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    
+    buffer += decoder.decode(value, { stream: true });
+    
+    // Events are separated by a blank line; the last part may be incomplete,
+    // so keep it in the buffer until the rest of it arrives
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    
+    for (const event of events) {
+      for (const line of event.split('\n')) {
+        if (line.startsWith('data: ')) {
+          onEvent(JSON.parse(line.slice(6)));
+        }
+      }
+    }
+  }
+}
+
+
 // ============================================================================
 // SEND FUNCTION - Send a message to the AI
 // ============================================================================
@@ -274,7 +336,7 @@ async function send() {
    * 4. Adds the message to the conversation history
    * 5. Shows a loading indicator
    * 6. Sends the conversation to the server via POST request
-   * 7. Receives and displays the AI's response
+   * 7. Displays the AI's response as it streams in
    * 8. Handles any errors that occur
    */
   
@@ -285,9 +347,25 @@ async function send() {
   // Get the selected source filter
   const sourceFilter = sourceFilterSelect.value;
   
+  // Get the selected model from the dropdown
+  const selectedModel = modelSelect.value;
+  
   // Build the user content with appropriate source-specific instructions
   const userContent = content + buildInstructions(sourceFilter);
   
+  // The same question as last time, to the same model and data source (a
+  // double Enter, or the same question pasted again): show the answer we
+  // already have, without a round-trip
+  const exchangeKey = `${selectedModel}|${sourceFilter}|${userContent}`;
+  if (lastExchange && lastExchange.key === exchangeKey) {
+    messages.push({ role: 'user', content: userContent });
+    messages.push({ role: 'assistant', content: lastExchange.answer });
+    promptEl.value = '';
+    render();
+    return;
+  }
+  lastExchange = null;
+  
   // Add the user's message to the conversation history
   messages.push({ role: 'user', content: userContent });
   
@@ -302,9 +380,6 @@ async function send() {
     // SHOW LOADING STATE
     // ========================================================================
     
-    // Get the selected model from the dropdown
-    const selectedModel = modelSelect.value;
-    
     // Show different loading messages based on the model
     // Deep research models take much longer (minutes instead of seconds)
     if (selectedModel.includes('deep-research')) {
@@ -322,26 +397,61 @@ async function send() {
     // SEND REQUEST TO SERVER
     // ========================================================================
     
-    // Send a POST request to the /api/chat endpoint
+    // Send a POST request to the /api/chat/stream endpoint
+    // (the streaming version of /api/chat - the answer arrives as it's written)
     // ?web=1 enables web search (the AI can look up current information)
     // ?model=... specifies which AI model to use (GPT or Claude)
     // ?source=... specifies the data source filter for web searches
-    const res = await fetch(`/api/chat?web=1&model=${selectedModel}&source=${sourceFilter}`, {
+    const res = await fetch(`/api/chat/stream?web=1&model=${selectedModel}&source=${sourceFilter}`, {
       method: 'POST',                                    // HTTP method
       headers: { 'Content-Type': 'application/json' },  // Tell server we're sending JSON
       body: JSON.stringify({ messages })                // Convert messages array to JSON string
     });
     
-    // Parse the JSON response from the server
-    const data = await res.json();
+    // ========================================================================
+    // HANDLE STREAMED RESPONSE
+    // ========================================================================
+    
+    if ((res.headers.get('Content-Type') || '').includes('text/event-stream')) {
+      // Add an empty assistant message and fill it in as the text arrives
+      const reply = { role: 'assistant', content: '' };
+      messages.push(reply);
+      let failed = false;
+      let finished = false;  // Set by the server's final {"done": true} event
+      
+      await readEventStream(res, (event) => {
+        if (event.delta) {
+          statusEl.textContent = '';  // The answer has started, so hide the loading message
+          reply.content += event.delta;
+          scheduleRender();
+        } else if (event.done) {
+          finished = true;
+        } else if (event.error) {
+          failed = true;
+          reply.content += (reply.content ? '\n\n' : '') + 'Error: ' + event.error;
+        }
+      });
+      
+      reply.content = reply.content.trim() || '(no response)';
+      // Only remember answers that arrived in full (a stream can also end
+      // early without an error, e.g. when a proxy closes the connection)
+      if (finished && !failed && reply.content !== '(no response)') {
+        lastExchange = { key: exchangeKey, answer: reply.content };
+      }
+      return;  // The finally block below does the final render
+    }
     
     // ========================================================================
-    // HANDLE RESPONSE
+    // HANDLE JSON RESPONSE (errors before the answer started)
     // ========================================================================
     
+    // Parse the JSON response from the server
+    const data = await res.json();
+    
     if (data && data.text) {
       // Success! Add the AI's response to the conversation
       messages.push({ role: 'assistant', content: data.text });
+      lastExchange = { key: exchangeKey, answer: data.text };
     } else if (data && data.error) {
       // Server returned an error message
       messages.push({ role: 'assistant', content: 'Error: ' + data.error });
@@ -385,6 +495,11 @@ async function send() {
 // When the submit button is clicked, send the message
 btn.addEventListener('click', send);
 
+// A different model or data source should get a fresh answer, even to the
+// same question
+modelSelect.addEventListener('change', () => { lastExchange = null; });
+sourceFilterSelect.addEventListener('change', () => { lastExchange = null; });
+
 // When the user presses Enter in the input field, send the message
 promptEl.addEventListener('keydown', (e) => {
   if (e.key === 'Enter') {
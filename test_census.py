@@ -1,5 +1,7 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,12 +19,28 @@ params = {
     "key": api_key
 }
 
+# One Session reuses its TCP/TLS connection across requests instead of
+# opening a new one for each call. Rate limits (429) and server errors are
+# retried a few times with a short backoff; raise_on_status=False means the
+# last error response is still printed below instead of raising.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False
+    )
+))
+
 print(f"Request URL: {url}")
 print(f"Parameters: {params}")
 print()
 
 try:
-    response = requests.get(url, params=params, timeout=10)
+    response = session.get(url, params=params, timeout=10)
     print(f"Status Code: {response.status_code}")
     print(f"Response Headers: {dict(response.headers)}")
     print()
@@ -0,0 +1,65 @@
+"""
+Tests for the request checks at the start of /api/chat, which turn away
+malformed requests before any search or AI call.
+
+Run with:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+
+# app.py reads its settings at import: give it a dummy key and keep the
+# caches in memory, so importing it doesn't touch real services or files
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ["LLM_CACHE_DB"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import MAX_MESSAGES, app  # noqa: E402
+
+
+class ChatValidationTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def post(self, body):
+        return self.client.post("/api/chat", json=body)
+
+    def assertRejected(self, response, status, error):
+        self.assertEqual(response.status_code, status)
+        self.assertIn(error, response.get_json()["error"])
+
+    def test_body_must_be_an_object(self):
+        for body in ([1, 2], "hello", 3):
+            with self.subTest(body=body):
+                self.assertRejected(self.post(body), 400, "request body must be a JSON object")
+
+    def test_messages_required(self):
+        for body in ({}, {"messages": []}, {"messages": "hi"}):
+            with self.subTest(body=body):
+                self.assertRejected(self.post(body), 400, "messages[] required")
+
+    def test_unknown_role_rejected(self):
+        response = self.post({"messages": [{"role": "bot", "content": "hi"}]})
+        self.assertRejected(response, 400, "messages[0] must have a role")
+
+    def test_non_string_content_rejected(self):
+        response = self.post({"messages": [{"role": "user", "content": 5}]})
+        self.assertRejected(response, 400, "messages[0].content must be a string")
+
+    def test_too_many_messages_rejected(self):
+        messages = [{"role": "user", "content": "hi"}] * (MAX_MESSAGES + 1)
+        self.assertRejected(self.post({"messages": messages}), 413, "too many messages")
+
+    def test_max_tokens_must_be_positive(self):
+        messages = [{"role": "user", "content": "population of bryan county"}]
+        for max_tokens in (0, -1, "abc"):
+            with self.subTest(max_tokens=max_tokens):
+                response = self.post({"messages": messages, "max_tokens": max_tokens})
+                self.assertRejected(response, 400, "max_tokens must be a positive number")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Behavior tests for SemanticCache (the reworded-question answer cache).
+
+Run with:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+
+# app.py reads its settings at import: give it a dummy key and keep the
+# caches in memory, so importing it doesn't touch real services or files
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ["LLM_CACHE_DB"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import SemanticCache  # noqa: E402
+
+QUESTION = ("Which counties in the Savannah region saw median household income "
+            "growth above the state average last year")
+
+
+class SemanticCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = SemanticCache(0.9, maxsize=16, ttl=60)
+        self.cache.put("chat", QUESTION, "first answer")
+
+    def test_reworded_question_matches(self):
+        reworded = ("Which counties in the Savannah region saw the median household "
+                    "income growth above the state average last year?")
+        self.assertEqual(self.cache.get("chat", reworded), "first answer")
+
+    def test_negation_does_not_match(self):
+        negated = QUESTION.replace("above", "not above")
+        self.assertIsNone(self.cache.get("chat", negated))
+
+    def test_contracted_negation_does_not_match(self):
+        self.cache.put("chat", "Is Bryan County growing faster than Chatham County", "yes")
+        self.assertIsNone(self.cache.get("chat", "Isn't Bryan County growing faster than Chatham County"))
+
+    def test_different_comparison_does_not_match(self):
+        self.assertIsNone(self.cache.get("chat", QUESTION.replace("above", "below")))
+
+    def test_added_qualifier_does_not_match(self):
+        narrowed = QUESTION.replace("Which counties", "Which counties excluding Chatham")
+        self.assertIsNone(self.cache.get("chat", narrowed))
+
+    def test_different_numbers_do_not_match(self):
+        self.cache.put("chat", "Median household income in Bryan County in 2021", "2021 answer")
+        self.assertIsNone(self.cache.get("chat", "Median household income in Bryan County in 2022"))
+
+    def test_stopwords_do_not_count_toward_similarity(self):
+        # Only "population" and "bryan" are real words here; a different
+        # county shouldn't match just because the filler words are the same
+        self.cache.put("chat", "What is the population of Bryan", "Bryan answer")
+        self.assertIsNone(self.cache.get("chat", "What is the population of Chatham"))
+
+    def test_threshold_zero_disables_cache(self):
+        cache = SemanticCache(0, maxsize=16, ttl=60)
+        cache.put("chat", QUESTION, "first answer")
+        self.assertIsNone(cache.get("chat", QUESTION))
+
+
+if __name__ == "__main__":
+    unittest.main()